@@ -0,0 +1,105 @@
+"""Measure the cold start of the edge handler for each shape of URL
+
+Every run is a fresh interpreter that imports ``lambda_function`` and
+handles a single request, against a local fake S3 (see ``fake_s3.py``),
+so no network access is needed. The import time and the latency of the
+first invocation are reported (median and worst of the runs), along with
+whether boto3 had to be loaded and the response (a redirect, a not found
+or the request passed on to the origin).
+
+    python benchmarks/cold_start.py --runs 20
+
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from fake_s3 import FakeBucket, FakeS3, library
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'sam-app', 'src')
+
+sys.path.insert(0, SRC)
+from lambda_function import CONTENTS_BUCKET_NAME  # noqa: E402
+
+# Imports the handler and invokes it once, reporting how long each took
+CHILD = '''
+import json, sys, time
+t0 = time.perf_counter()
+import lambda_function
+t1 = time.perf_counter()
+ret = lambda_function.lambda_handler(json.loads(sys.argv[1]), None)
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "invoke": t2 - t1, "boto3": "boto3" in sys.modules,
+                  "status": str(ret.get("status", "origin"))}))
+'''
+
+
+def url_shapes(book, page):
+    """The URL (shapes) to measure, by name"""
+    return {
+        'contents': f'/contents/{book}:{page}.html',
+        'pinned': f'/baked/{book}@1.3:{page}@3.html',
+        'latest raw (listing)': f'/raw/{page}.json',
+        'latest book (listing)': f'/baked/{book}.html',
+        'latest page (pointer)': f'/baked/{book}:{page}.html',
+        'latest page (listing)': f'/baked/{book}:{page}.json',
+    }
+
+
+def event(uri):
+    return {'Records': [{'cf': {'request': {'uri': uri, 'method': 'GET', 'headers': {}}}}]}
+
+
+def run(uri, env):
+    proc = subprocess.run([sys.executable, '-c', CHILD, json.dumps(event(uri))],
+                          cwd=SRC, env=env, check=True, stdout=subprocess.PIPE,
+                          universal_newlines=True)
+    # the handler may log to stdout as well
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10, help='runs of each URL shape')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    book_ids, page_ids, keys = library(books=2, versions=3, pages=5)
+    book, page = book_ids[0], page_ids[0]
+    pointer = json.dumps({'id': book, 'version': '1.3', 'key': f'baked/{book}@1.3:{page}@3.html'})
+    objects = {f'baked/latest/{book}:{page}.html': pointer.encode('utf-8')}
+    bucket = FakeBucket(keys, objects)
+
+    results = {}
+    with FakeS3({CONTENTS_BUCKET_NAME: bucket}) as s3:
+        env = dict(os.environ, S3_ENDPOINT_URL=s3.endpoint_url, AWS_ACCESS_KEY_ID='fake',
+                   AWS_SECRET_ACCESS_KEY='fake', AWS_DEFAULT_REGION='us-east-1',
+                   AWS_EC2_METADATA_DISABLED='true')
+        env.pop('AWS_PROFILE', None)
+        for name, uri in url_shapes(book, page).items():
+            runs = [run(uri, env) for i in range(args.runs)]
+            results[name] = {
+                'import_ms': [r['import'] * 1000 for r in runs],
+                'invoke_ms': [r['invoke'] * 1000 for r in runs],
+                'boto3': any(r['boto3'] for r in runs),
+                'status': runs[-1]['status'],
+            }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"URL shape":<24}{"import ms (p50/max)":>22}{"first invocation ms (p50/max)":>32}  boto3  status')
+    for name, result in results.items():
+        import_ms, invoke_ms = result['import_ms'], result['invoke_ms']
+        print(f'{name:<24}'
+              f'{statistics.median(import_ms):>14.1f} / {max(import_ms):<5.1f}'
+              f'{statistics.median(invoke_ms):>24.1f} / {max(invoke_ms):<5.1f}'
+              f'  {"yes" if result["boto3"] else "no ":<5}  {result["status"]}')
+
+
+if __name__ == '__main__':
+    main()
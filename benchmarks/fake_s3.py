@@ -0,0 +1,185 @@
+"""A local, in-memory stand-in for the S3 API the edge handlers use
+
+Only what the handlers need is implemented: ListObjectsV2 (with prefix,
+delimiter, max-keys and continuation tokens) and GetObject. Requests are
+accepted path-style (``/{bucket}/{key}``, as boto3 sends them to an
+``endpoint_url``) as well as virtual-hosted (``/{key}`` on the bucket's
+host, as the request-handler sends them).
+
+"""
+import bisect
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+S3_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+class FakeBucket:
+    """The sorted keys (and the bodies of the objects that have one)"""
+
+    def __init__(self, keys=(), objects=None):
+        self.objects = dict(objects or {})
+        self.keys = sorted(set(keys) | set(self.objects))
+
+    def list(self, prefix='', delimiter=None, max_keys=1000, token=None):
+        """One page of a listing: the keys and common prefixes, in order,
+        and the continuation token of the next page if there is one
+        """
+        if token is None:
+            i = bisect.bisect_left(self.keys, prefix)
+        elif token.startswith('P'):
+            i = bisect.bisect_left(self.keys, successor(token[1:]))
+        else:
+            i = bisect.bisect_right(self.keys, token[1:])
+
+        # The token is the last key (K) or common prefix (P) listed
+        contents, common_prefixes, last = [], [], None
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            if len(contents) + len(common_prefixes) == max_keys:
+                return contents, common_prefixes, last
+            key = self.keys[i]
+            at = key.find(delimiter, len(prefix)) if delimiter else -1
+            if at == -1:
+                contents.append(key)
+                last = f'K{key}'
+                i += 1
+            else:
+                common_prefix = key[:at + len(delimiter)]
+                common_prefixes.append(common_prefix)
+                last = f'P{common_prefix}'
+                # skip over everything under the common prefix
+                i = bisect.bisect_left(self.keys, successor(common_prefix))
+        return contents, common_prefixes, None
+
+
+def successor(prefix):
+    """The first string after all those starting with ``prefix``"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # or the headers and the body, written apart, are held back
+    # until the client acknowledges (with a delay) the headers
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        host = self.headers.get('Host', '').split(':')[0]
+        bucket_name = host.split('.s3.')[0] if '.s3.' in host else None
+        path = unquote(url.path)
+        if bucket_name is None:
+            bucket_name, _, path = path.lstrip('/').partition('/')
+        else:
+            path = path.lstrip('/')
+        bucket = self.server.buckets.get(bucket_name)
+        if bucket is None:
+            return self.error(404, 'NoSuchBucket')
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not path and query.get('list-type') == '2':
+            return self.list_objects(bucket, query)
+        self.server.count_get()
+        if path in bucket.objects:
+            return self.send(200, bucket.objects[path], 'application/json')
+        return self.error(404, 'NoSuchKey')
+
+    def list_objects(self, bucket, query):
+        prefix = query.get('prefix', '')
+        contents, common_prefixes, token = bucket.list(
+            prefix, query.get('delimiter'), int(query.get('max-keys', 1000)),
+            query.get('continuation-token'))
+        self.server.count(len(contents) + len(common_prefixes))
+
+        body = [f'<?xml version="1.0" encoding="UTF-8"?>\n<ListBucketResult xmlns="{S3_XMLNS}">',
+                f'<Prefix>{escape(prefix)}</Prefix>',
+                f'<KeyCount>{len(contents) + len(common_prefixes)}</KeyCount>']
+        body.extend(f'<Contents><Key>{escape(key)}</Key><Size>0</Size></Contents>' for key in contents)
+        body.extend(f'<CommonPrefixes><Prefix>{escape(common_prefix)}</Prefix></CommonPrefixes>'
+                    for common_prefix in common_prefixes)
+        if token is None:
+            body.append('<IsTruncated>false</IsTruncated>')
+        else:
+            body.append('<IsTruncated>true</IsTruncated>')
+            body.append(f'<NextContinuationToken>{escape(token)}</NextContinuationToken>')
+        body.append('</ListBucketResult>')
+        self.send(200, ''.join(body).encode('utf-8'), 'application/xml')
+
+    def error(self, status, code):
+        body = f'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{code}</Code></Error>'
+        self.send(status, body.encode('utf-8'), 'application/xml')
+
+    def send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeS3(ThreadingHTTPServer):
+    """A fake S3 of ``buckets`` (names to ``FakeBucket``) on a local port,
+    counting the listing requests (and the keys they returned)
+    and the object requests
+    """
+
+    daemon_threads = True
+
+    def __init__(self, buckets, address=('127.0.0.1', 0)):
+        super().__init__(address, FakeS3Handler)
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset_counts()
+
+    @property
+    def endpoint_url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def count(self, keys):
+        with self._lock:
+            self.list_calls += 1
+            self.keys_listed += keys
+
+    def count_get(self):
+        with self._lock:
+            self.get_calls += 1
+
+    def reset_counts(self):
+        self.list_calls = 0
+        self.keys_listed = 0
+        self.get_calls = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def library(books, versions, pages, formats=('json', 'html')):
+    """The keys (in the dumper's layout) of a library of ``books``
+    of ``versions`` versions (``1.1``, ``1.2``, ...) of ``pages`` pages,
+    as ``(book_ids, page_ids, keys)``
+    """
+    book_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f'book-{b}')) for b in range(books)]
+    page_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f'page-{b}-{p}'))
+                for b in range(books) for p in range(pages)]
+    keys = []
+    for b, book in enumerate(book_ids):
+        for v in range(1, versions + 1):
+            for format_ in formats:
+                keys.append(f'raw/{book}@1.{v}.{format_}')
+                keys.append(f'baked/{book}@1.{v}.{format_}')
+            for page in page_ids[b * pages:(b + 1) * pages]:
+                for format_ in formats:
+                    keys.append(f'raw/{page}@{v}.{format_}')
+                    keys.append(f'baked/{book}@1.{v}:{page}@{v}.{format_}')
+    return book_ids, page_ids, keys
@@ -0,0 +1,191 @@
+"""Benchmark how the edge handlers resolve each shape of URL at scale
+
+Both ``lambda_handler`` implementations (``sam-app/src`` and the legacy
+``request-handler``) are run against a local fake S3 (see ``fake_s3.py``)
+seeded with the README's confirmation scenario: 40 books of 200 pages in
+50 versions, i.e. 400,000 baked pages (and as many raw ones). No network
+access is needed.
+
+For every URL shape the latency (p50/p99), the S3 listing and object
+requests, and the keys listed per request are reported. The handlers'
+caches are cleared before every request, so each one is resolved anew.
+
+    python benchmarks/resolution.py --requests 200
+    python benchmarks/resolution.py --books 4 --pointers --key-index
+    python benchmarks/resolution.py --inverted
+
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+from fake_s3 import FakeBucket, FakeS3, library
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HANDLERS = {
+    'sam-app': os.path.join(HERE, '..', 'sam-app', 'src', 'lambda_function.py'),
+    'request-handler': os.path.join(HERE, '..', 'request-handler', 'lambda_function.py'),
+}
+# (both handlers import the shared modules from here)
+sys.path.insert(0, os.path.join(HERE, '..', 'sam-app', 'src'))
+from key_index import KeyIndex, build  # noqa: E402
+from version_index import invert_key  # noqa: E402
+
+
+def load_handler(name):
+    spec = importlib.util.spec_from_file_location(f'{name.replace("-", "_")}_lambda_function',
+                                                  HANDLERS[name])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def url_shapes(book_ids, page_ids, pages, versions):
+    """The URL shapes to measure, by name, as functions
+    of a random number generator returning a URL
+    """
+    def book_and_page(rng):
+        b = rng.randrange(len(book_ids))
+        return book_ids[b], page_ids[b * pages + rng.randrange(pages)]
+
+    def shape(template):
+        def url(rng):
+            book, page = book_and_page(rng)
+            return template.format(book=book, page=page, v=rng.randint(1, versions))
+        return url
+
+    return {
+        'contents': shape('/contents/{book}:{page}.html'),
+        'pinned page': shape('/baked/{book}@1.{v}:{page}@{v}.html'),
+        'latest raw page': shape('/raw/{page}.html'),
+        'latest raw book': shape('/raw/{book}.html'),
+        'latest baked book': shape('/baked/{book}.html'),
+        'latest baked page': shape('/baked/{book}:{page}.html'),
+        'page of pinned book': shape('/baked/{book}@1.{v}:{page}.html'),
+        'unknown': lambda rng: f'/raw/{uuid.UUID(int=rng.getrandbits(128))}.html',
+    }
+
+
+def latest_pointers(book_ids, page_ids, pages, versions, layout_key=str):
+    """The dumper's "latest version" pointer objects of a ``library``,
+    pointing at the keys of the layout (see ``layout_key``)
+    """
+    latest = f'1.{versions}'
+    objects = {}
+    for b, book in enumerate(book_ids):
+        pointers = {
+            f'raw/latest/{book}.html': f'raw/{book}@{latest}.html',
+            f'baked/latest/{book}.html': f'baked/{book}@{latest}.html',
+        }
+        for page in page_ids[b * pages:(b + 1) * pages]:
+            pointers[f'raw/latest/{page}.html'] = f'raw/{page}@{versions}.html'
+            pointers[f'baked/latest/{book}:{page}.html'] = f'baked/{book}@{latest}:{page}@{versions}.html'
+        for pointer_key, key in pointers.items():
+            pointer = {'id': book, 'version': latest, 'key': layout_key(key)}
+            objects[pointer_key] = json.dumps(pointer).encode('utf-8')
+    return objects
+
+
+def event(uri):
+    return {'Records': [{'cf': {'request': {'uri': uri, 'method': 'GET', 'headers': {}}}}]}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[round(q * (len(values) - 1))]
+
+
+def measure(handler, s3, urls, rng, requests):
+    latencies, statuses = [], {}
+    s3.reset_counts()
+    # (the handlers log to stdout)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(requests):
+            uri = urls(rng)
+            handler.LISTING_CACHE.clear()
+            start = time.perf_counter()
+            ret = handler.lambda_handler(event(uri), None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            status = str(ret.get('status', 'origin'))
+            statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'p50_ms': percentile(latencies, 0.5),
+        'p99_ms': percentile(latencies, 0.99),
+        'list_calls': s3.list_calls / requests,
+        'get_calls': s3.get_calls / requests,
+        'keys_listed': s3.keys_listed / requests,
+        'statuses': statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--books', type=int, default=40)
+    parser.add_argument('--pages', type=int, default=200, help='pages per book')
+    parser.add_argument('--versions', type=int, default=50, help='versions per book')
+    parser.add_argument('--requests', type=int, default=100, help='requests per URL shape')
+    parser.add_argument('--pointers', action='store_true',
+                        help="seed the dumper's latest version pointers as well")
+    parser.add_argument('--key-index', action='store_true',
+                        help='give the sam-app handler a key index of the bucket')
+    parser.add_argument('--inverted', action='store_true',
+                        help="seed the dumper's inverted key layout (only the sam-app handler reads it)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    book_ids, page_ids, keys = library(args.books, args.versions, args.pages, formats=('html',))
+    layout_key = invert_key if args.inverted else str
+    objects = {}
+    if args.pointers:
+        objects = latest_pointers(book_ids, page_ids, args.pages, args.versions, layout_key)
+    bucket = FakeBucket([layout_key(key) for key in keys], objects)
+    print(f'{len(bucket.keys)} keys seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    results = {}
+    with FakeS3({}) as s3:
+        os.environ.update(S3_ENDPOINT_URL=s3.endpoint_url, AWS_ACCESS_KEY_ID='fake',
+                          AWS_SECRET_ACCESS_KEY='fake', AWS_DEFAULT_REGION='us-east-1',
+                          AWS_EC2_METADATA_DISABLED='true')
+        os.environ.pop('AWS_PROFILE', None)
+        for name in HANDLERS:
+            if args.inverted and name != 'sam-app':
+                continue
+            handler = load_handler(name)
+            if name == 'sam-app':
+                handler.KEY_INDEX = KeyIndex(build(keys)) if args.key_index else None
+                handler.KEY_LAYOUT = 'inverted' if args.inverted else 'ident-hash'
+                bucket_name = handler.CONTENTS_BUCKET_NAME
+            else:
+                bucket_name = handler.BUCKET_NAME
+            s3.buckets[bucket_name] = bucket
+
+            shapes = url_shapes(book_ids, page_ids, args.pages, args.versions)
+            # warm up (cold starts are measured by cold_start.py)
+            measure(handler, s3, shapes['latest baked page'], random.Random(), 1)
+            rng = random.Random(args.seed)
+            for shape, urls in shapes.items():
+                results.setdefault(name, {})[shape] = measure(handler, s3, urls, rng, args.requests)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"handler":<16}{"URL shape":<22}{"p50 ms":>8}{"p99 ms":>8}'
+          f'{"lists/req":>11}{"gets/req":>10}{"keys/req":>10}  statuses')
+    for name, shapes in results.items():
+        for shape, result in shapes.items():
+            statuses = ' '.join(f'{status}:{n}' for status, n in sorted(result['statuses'].items()))
+            print(f'{name:<16}{shape:<22}{result["p50_ms"]:>8.2f}{result["p99_ms"]:>8.2f}'
+                  f'{result["list_calls"]:>11.2f}{result["get_calls"]:>10.2f}'
+                  f'{result["keys_listed"]:>10.1f}  {statuses}')
+
+
+if __name__ == '__main__':
+    main()
@@ -16,31 +16,194 @@ For resources:
 
 - ``/resources/{sha1}``
 
+Every raw and baked upload also maintains a small "latest version" pointer
+object, which names the key of the newest version dumped so far:
+
+- ``/raw/latest/{uuid}.json``
+- ``/raw/latest/{uuid}.html``
+- ``/baked/latest/{uuid}.json``
+- ``/baked/latest/{uuid}.html``
+- ``/baked/latest/{uuid}:{uuid}.json``
+- ``/baked/latest/{uuid}:{uuid}.html``
+
+
+With ``--layout inverted`` the versions of the raw and baked keys are
+inverted (see ``invert_version``), so that S3 lists the newest first.
+
 
 Note, this is only intended to be used with a book, not individual pages.
 
 """
+import collections
+import contextlib
+import gzip
+import importlib.util
 import io
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
 import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from functools import partial
+from queue import Queue
 
 import boto3
+import botocore.config
 import click
 import cnxcommon
 import requests
 from blessings import Terminal
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 from cnxcommon.ident_hash import join_ident_hash, split_ident_hash
+from urllib3.util.retry import Retry
+
+try:
+    import brotli
+except ImportError:
+    # Optional, only needed to precompress with brotli
+    brotli = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# The edge function's parsing of the versions, whose inverted form (see
+# ``LAYOUTS``) it decodes. (``sam-app/src`` isn't a package.)
+_spec = importlib.util.spec_from_file_location(
+    'version_index', os.path.join(HERE, '..', 'sam-app', 'src', 'version_index.py'))
+version_index = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(version_index)
 
 
 VERBOSE = False
 T = Terminal()
 
-s3 = boto3.resource('s3')
+MB = 1024 ** 2
+# Objects above the threshold are uploaded in parts, several at a time
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * MB,
+                                 multipart_chunksize=8 * MB,
+                                 max_concurrency=4)
+# Streamed uploads (see ``StreamedResponse``) hold no more than this many
+# parts in memory, i.e. 32 MB per in-flight transfer.
+TRANSFER_CONFIG.max_in_memory_upload_chunks = 4
+# Resources larger than this (or of unknown size) are streamed
+# from archive to s3 rather than read into memory.
+STREAM_THRESHOLD = TRANSFER_CONFIG.multipart_threshold
+
+# Content-Encoding -> key extension and compression function
+# of the precompressed siblings of the HTML and JSON content
+PRECOMPRESSORS = {
+    'gzip': ('.gz', partial(gzip.compress, compresslevel=9, mtime=0)),
+}
+if brotli is not None:
+    PRECOMPRESSORS['br'] = ('.br', partial(brotli.compress, quality=11))
+PRECOMPRESSED_FORMATS = ('.html', '.json')
 
 
+def precompressed_keys(key, precompress):
+    """The keys of the ``precompress`` encodings' siblings of ``key``"""
+    if not key.endswith(PRECOMPRESSED_FORMATS):
+        return []
+    return [f'{key}{PRECOMPRESSORS[encoding][0]}' for encoding in precompress]
+
+assert precompressed_keys('abc123@1.1.json', ('gzip',)) == ['abc123@1.1.json.gz']
+assert precompressed_keys('abc123@1.1.json', ()) == []
+assert precompressed_keys('deadbeef', ('gzip',)) == []
+
+# Every dumped object is keyed by its version (or its SHA1),
+# so it never changes and can be cached for good.
+PINNED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# The "latest version" pointers move with every new version
+POINTER_CACHE_CONTROL = 'public, max-age=60'
+
+# Layouts of the raw and baked keys: with the versions of the ident-hashes
+# as they are, or inverted (see ``invert_version``) so that S3 lists the
+# newest version of the content first.
+LAYOUTS = ('ident-hash', 'inverted')
+
 session = requests.Session()
-adapter = requests.adapters.HTTPAdapter(max_retries=5)
-session.mount('https://', adapter)
+
+
+class RateLimiter:
+    """Spaces the requests to archive out to at most ``rate`` a second.
+
+    The time of the next request is kept in shared memory, so the limit
+    holds across the threads and the processes (see ``--jobs``) the
+    limiter is shared with.
+
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        # (the monotonic clock is system-wide)
+        self.next_request = multiprocessing.Value('d', 0.0)
+
+    def wait(self):
+        with self.next_request.get_lock():
+            now = time.monotonic()
+            at = max(now, self.next_request.value)
+            self.next_request.value = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class RateLimitedRetry(Retry):
+    """Retry (see ``configure_session``) waiting on a ``RateLimiter``
+    after its backoff, so that the retries of a request are rate limited
+    like the request itself (see ``RateLimitedAdapter``)
+    """
+
+    def __init__(self, rate_limiter=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def new(self, **kwargs):
+        return super().new(rate_limiter=self.rate_limiter, **kwargs)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+
+
+class RateLimitedAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter waiting on a ``RateLimiter`` before each request
+    (its retries wait on a ``RateLimitedRetry``)
+    """
+
+    def __init__(self, rate_limiter, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.rate_limiter.wait()
+        return super().send(request, **kwargs)
+
+
+def configure_session(concurrency=1, rate_limiter=None):
+    """Mount an adapter on the shared session with a connection pool
+    large enough for ``concurrency`` requests to the archive host,
+    retrying with exponential backoff when archive is overloaded
+    (429 and 5xx responses honor any ``Retry-After`` header),
+    and holding back to the ``rate_limiter`` if given.
+    """
+    retry = RateLimitedRetry(rate_limiter, total=5, backoff_factor=0.5,
+                             status_forcelist=(429, 500, 502, 503, 504))
+    kwargs = {'pool_maxsize': max(concurrency, 10), 'max_retries': retry}
+    if rate_limiter is None:
+        adapter = requests.adapters.HTTPAdapter(**kwargs)
+    else:
+        adapter = RateLimitedAdapter(rate_limiter, **kwargs)
+    session.mount('https://', adapter)
+
+
+configure_session()
 
 
 def info(msg):
@@ -51,16 +214,36 @@ def debug(msg):
     if VERBOSE: print(msg, file=sys.stderr)
 
 
+# Fixed-width form of a version for the inverted layout, which sorts the
+# newest version first (e.g. ``'1.10'`` -> ``'9997.9988.9999'``). Absent
+# parts sort after all others, so ``1.10`` comes after ``1.10.1``.
+invert_version = version_index.invert_version
 
+assert invert_version('1.10') == '9997.9988.9999'
+assert invert_version('21') == '9977.9999.9999'
+assert sorted(['1.9', '1.10', '1.10.1', '2'], key=invert_version) == ['2', '1.10.1', '1.10', '1.9']
 
-def gen_filepath(type_, ident, raw_prefix='', baked_prefix='', resource_prefix=''):
+
+def gen_filepath(type_, ident, raw_prefix='', baked_prefix='', resource_prefix='',
+                 latest=False, layout='ident-hash'):
     """Given a content type and an ids structure
     produce the S3 filepath to the object.
 
     For json and html the ``ident`` sequence of one or more tuples of UUID and version.
     For a resource the ``ident`` is the SHA1.
 
+    When ``latest`` is true the filepath of the versionless "latest version"
+    pointer object is produced instead.
+
+    The ``layout`` is one of ``LAYOUTS``.
+
     """
+    if layout == 'inverted' and not latest and not type_.startswith('resource'):
+        ident = [(id, version and invert_version(version)) for id, version in ident]
+    if latest:
+        ident = [(id, None) for id, version in ident]
+        raw_prefix = f'{raw_prefix}latest/'
+        baked_prefix = f'{baked_prefix}latest/'
     if not type_.startswith('resource'):
         ids = [join_ident_hash(*i) for i in ident]
     else:
@@ -75,6 +258,7 @@ def gen_filepath(type_, ident, raw_prefix='', baked_prefix='', resource_prefix='
         'baked-book-html': lambda i: f'{baked_prefix}{i[0]}.html',
         'baked-page-json': lambda i: f'{baked_prefix}{i[0]}:{i[1]}.json',
         'baked-page-html': lambda i: f'{baked_prefix}{i[0]}:{i[1]}.html',
+        'baked-book-done': lambda i: f'{baked_prefix}done/{i[0]}',
         'resource': lambda i: f'{resource_prefix}{i}',
         'resource-media-type': lambda i: f'{resource_prefix}{i}-media-type',
     }[type_]
@@ -91,21 +275,222 @@ assert gen_filepath('baked-book-json', [('abc123', '1.1')]) == 'abc123@1.1.json'
 assert gen_filepath('baked-book-html', [('abc123', '1.1')]) == 'abc123@1.1.html'
 assert gen_filepath('baked-page-json', [('abc123', '1.1'), ('def456', None)]) == 'abc123@1.1:def456.json'
 assert gen_filepath('baked-page-html', [('abc123', '1.1'), ('def456', None)]) == 'abc123@1.1:def456.html'
+assert gen_filepath('baked-book-done', [('abc123', '1.1')], baked_prefix='baked/') == 'baked/done/abc123@1.1'
 assert gen_filepath('resource', 'deadbeef') == 'deadbeef'
 assert gen_filepath('resource-media-type', 'deadbeef') == 'deadbeef-media-type'
+assert gen_filepath('raw-book-json', [('abc123', '1.1')], latest=True) == 'latest/abc123.json'
+assert gen_filepath('raw-page-html', [('abc123', '1.1'), ('def456', '9')], latest=True) == 'latest/def456.html'
+assert gen_filepath('baked-book-html', [('abc123', '1.1')], raw_prefix='raw/', baked_prefix='baked/', latest=True) == 'baked/latest/abc123.html'
+assert gen_filepath('baked-page-json', [('abc123', '1.1'), ('def456', '9')], latest=True) == 'latest/abc123:def456.json'
+assert gen_filepath('raw-page-html', [('abc123', '1.1'), ('def456', '9')], layout='inverted') == 'def456@9989.9999.9999.html'
+assert gen_filepath('baked-page-json', [('abc123', '1.1'), ('def456', None)], layout='inverted') == 'abc123@9997.9997.9999:def456.json'
+assert gen_filepath('baked-book-html', [('abc123', '1.1')], latest=True, layout='inverted') == 'latest/abc123.html'
+assert gen_filepath('resource', 'deadbeef', layout='inverted') == 'deadbeef'
+assert gen_filepath('baked-book-done', [('abc123', '1.1')], layout='inverted') == 'done/abc123@9997.9997.9999'
+
+
+def version_key(version):
+    """Sortable form of a version (e.g. ``'1.10'`` -> ``(1, 10)``)"""
+    return tuple(int(i) for i in version.split('.'))
+
+assert version_key('1.10') > version_key('1.9')
+assert version_key('9') < version_key('9.1')
+
+
+class ResourceRegistry:
+    """The resources (by SHA1) that are already, or are being, dumped
+
+    Resources are shared by many pages and books, and are stored by
+    their SHA1, so each one only needs to be transferred once.
+    ``load`` adds the resources stored by previous runs.
+
+    A resource is ``claim``-ed when it is scraped, and registered as
+    ``dumped`` once uploaded. When a book fails, the resources it claimed
+    but didn't upload are ``release``-d, to be dumped by another book.
+
+    The registry is shared by the processes of a ``--jobs`` dump when
+    given a shared dict (of SHA1s) and lock, e.g. those of a
+    ``multiprocessing.Manager``; ``skipped`` counts those of this process.
+
+    """
+
+    def __init__(self, sha1s=None, lock=None):
+        # (SHA1s to whether they are dumped, else only claimed)
+        self._sha1s = {} if sha1s is None else sha1s
+        self._lock = threading.Lock() if lock is None else lock
+        # (those claimed by this process and not dumped yet)
+        self._claimed = set()
+        self.skipped = 0
+
+    def __contains__(self, sha1):
+        return sha1 in self._sha1s
+
+    def __len__(self):
+        return len(self._sha1s)
+
+    def claim(self, sha1):
+        """Claim the resource for dumping, which is ``False``
+        when it has already been claimed or dumped
+        """
+        with self._lock:
+            if sha1 in self._sha1s:
+                self.skipped += 1
+                return False
+            self._sha1s[sha1] = False
+            self._claimed.add(sha1)
+            return True
+
+    def dumped(self, sha1):
+        """Register the resource as uploaded"""
+        with self._lock:
+            self._sha1s[sha1] = True
+            self._claimed.discard(sha1)
+
+    def release(self):
+        """Release the resources claimed (by this process)
+        but not dumped, e.g. those of a book that failed
+        """
+        with self._lock:
+            for sha1 in self._claimed:
+                if not self._sha1s.get(sha1, True):
+                    del self._sha1s[sha1]
+            self._claimed.clear()
+
+    def load(self, s3_client, bucket_name, prefix=''):
+        """Add the resources already in the bucket, with a single listing"""
+        paginator = s3_client.get_paginator('list_objects_v2')
+        with self._lock:
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                # (one update a page, which is one call to a shared dict)
+                self._sha1s.update({
+                    obj['Key'][len(prefix):]: True
+                    for obj in page.get('Contents', [])
+                    if not obj['Key'].endswith('-media-type')
+                })
+
+test_registry = ResourceRegistry()
+assert test_registry.claim('ab' * 20) and test_registry.claim('cd' * 20)
+assert not test_registry.claim('ab' * 20)
+test_registry.dumped('ab' * 20)
+test_registry.release()
+assert 'ab' * 20 in test_registry and 'cd' * 20 not in test_registry
 
 
 VISITED_LOCS_MARKER = object()
 
 
-def scrape(book, host, visited_locs=VISITED_LOCS_MARKER):
+class ExistingContent:
+    """The content already in the buckets, for incremental dumps
+
+    Each bucket is listed once, on first use. Keys are remembered as they
+    are checked, so content shared by several versions of a book
+    (e.g. unchanged raw pages) is only dumped once per run as well.
+
+    Parameters
+    ----------
+    s3_client: botocore client
+    bucket_names: dict
+        Bucket names by label (raw, baked and resources)
+    prefixes: dict
+        Key prefixes by label
+    filepath: callable
+        ``gen_filepath`` with the prefixes applied
+    precompress: sequence
+        Encodings of the precompressed siblings the content needs
+        to have for it to be skipped (see ``precompressed_keys``)
+
+    """
+
+    def __init__(self, s3_client, bucket_names, prefixes, filepath, precompress=()):
+        self.s3_client = s3_client
+        self.bucket_names = bucket_names
+        self.prefixes = prefixes
+        self.filepath = filepath
+        self.precompress = precompress
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.versions_skipped = 0
+
+    def _keys_in(self, label):
+        # Called with the lock held
+        if label not in self._keys:
+            keys = set()
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_names[label], Prefix=self.prefixes[label]):
+                keys.update(obj['Key'] for obj in page.get('Contents', []))
+            self._keys[label] = keys
+        return self._keys[label]
+
+    def skip(self, type_, ident):
+        """Is the content already in its bucket (or already seen by this run)"""
+        if type_.startswith('resource'):
+            # see ``ResourceRegistry``
+            return False
+        key = self.filepath(type_, ident)
+        siblings = precompressed_keys(key, self.precompress)
+        with self._lock:
+            keys = self._keys_in(bucket_label(type_))
+            if key in keys and keys.issuperset(siblings):
+                self.skipped += 1
+                return True
+            keys.add(key)
+            keys.update(siblings)
+            return False
+
+    def skip_version(self, id, version):
+        """Is the version of the book already in the baked bucket,
+        going by the marker written once all of it was dumped
+        (see ``version_done``), and by the precompressed siblings
+        of its baked book JSON (a version dumped without them isn't)
+        """
+        key = self.filepath('baked-book-done', [(id, version)])
+        siblings = precompressed_keys(self.filepath('baked-book-json', [(id, version)]), self.precompress)
+        with self._lock:
+            keys = self._keys_in('baked')
+            if key in keys and keys.issuperset(siblings):
+                self.versions_skipped += 1
+                return True
+            return False
+
+
+class VersionUnavailable(Exception):
+    """Archive can't serve a version of a book, e.g. it is missing
+    or was never baked (see ``book_json``)
+    """
+
+
+def book_json(resp):
+    """The JSON of the response for a version of a book,
+    raising ``VersionUnavailable`` when it is an error or isn't JSON
+    """
+    if resp.status_code != 200:
+        raise VersionUnavailable(f'{resp.url} answered {resp.status_code}')
+    try:
+        return resp.json()
+    except ValueError:
+        raise VersionUnavailable(f'{resp.url} answered with something other than JSON')
+
+
+def scrape(book, host, visited_locs=VISITED_LOCS_MARKER, concurrency=1, skip=None,
+           all_versions=False, skip_version=None, bulk=False, unavailable=None):
     """Scrape the given book (ident-hash) from the archive.cnx.org site.
-    This scrapes the JSON, HTML and resources for all versions of the content.
+    This scrapes the JSON, HTML and resources of the latest version,
+    followed by the historical versions when ``all_versions`` is true.
+    Up to ``concurrency`` requests are made at once.
+    Content for which ``skip(type, ident)`` is true isn't yielded
+    (see ``scrape_version_task``),
+    nor are versions for which ``skip_version(id, version)`` is true.
+    The historical versions archive can't serve are skipped and appended
+    to the ``unavailable`` list (of ids and versions), if given.
+    With ``bulk`` the baked HTML of the pages is taken from their baked JSON
+    (see ``scrape_version_task``).
+    Each version is followed by its ``version_done`` item.
     """
-    # ``visited_locs`` is a shared list of visited locations,
-    # primarily so we don't re-visit resources.
+    # ``visited_locs`` is a shared ``ResourceRegistry``,
+    # so we don't re-visit resources.
     if visited_locs is VISITED_LOCS_MARKER:
-        visited_locs = []
+        visited_locs = ResourceRegistry()
 
     try:
         id, version = split_ident_hash(book)
@@ -114,24 +499,46 @@ def scrape(book, host, visited_locs=VISITED_LOCS_MARKER):
     base_url = f'https://{host}/contents'
 
     # Request the latest version
+    # With this we'll have access to the list of past versions
     url = f'{base_url}/{id}.json'
     resp = session.get(url)
-    version = resp.json()['version']
+    resp.raise_for_status()
+    latest = resp.json()
+    version = latest['version']
 
     info(f'latest version of requested book: {T.bold}{id}@{version}{T.normal}')
 
-    # Get the latest version's contents and resources
-    # With this we'll have access to the list of past versions
-    for item in scrape_version(id, version, host, visited_locs):
-        data, media_type, type, id = item
-        if type == 'raw-book-json':
-            # TODO: Make note of the historical versions for later scraping
-            historical = []
-        yield item
+    versions = [version]
+    if all_versions:
+        # The history is ordered from the newest version down
+        versions.extend(entry['version'] for entry in latest.get('history', [])
+                        if entry['version'] != version)
+        info(f'{len(versions)} versions of {T.bold}{id}{T.normal} to dump')
 
-    # TODO: Yield this latest version before progressing to yielding subversions
+    for version in versions:
+        if skip_version is not None and skip_version(id, version):
+            debug(f'Skipping {T.bold}{id}@{version}{T.normal}, it has already been dumped')
+            continue
+        try:
+            yield from scrape_version(id, version, host, visited_locs, concurrency=concurrency, skip=skip,
+                                      bulk=bulk)
+        except VersionUnavailable as exc:
+            # (nothing of the version was yielded, see ``scrape_version_task``)
+            if version == versions[0]:
+                raise
+            info(f'{T.red}Skipping {id}@{version}{T.normal}, archive can\'t serve it: {exc}')
+            if unavailable is not None:
+                unavailable.append((id, version))
+            continue
+        yield version_done(id, version)
 
-    # TODO: Yield the historical versions of this book
+
+def version_done(id, version):
+    """The item marking the end of a version of a book's items, whose
+    marker ``dump_in_bucket`` writes once they are all dumped
+    """
+    body = json.dumps({'id': id, 'version': version}).encode('utf-8')
+    return io.BytesIO(body), 'application/json', 'baked-book-done', [(id, version)]
 
 
 def flatten_tree_to_ident_hashes(item_or_tree):
@@ -177,10 +584,116 @@ test_tree_idents = [
 assert list(flatten_tree_to_ident_hashes(test_tree)) == test_tree_idents
 
 
+def run_tasks(tasks, concurrency=1):
+    """Run the scraping ``tasks``, yielding the items they produce.
+
+    A task is a callable that returns a list of items and a list of
+    further tasks. With a ``concurrency`` above one the tasks run on a
+    thread pool and the items are yielded as their tasks complete.
+    At most twice ``concurrency`` tasks are started ahead of the consumer,
+    so a slow consumer holds the scraping back
+    rather than letting responses pile up in memory.
+
+    """
+    queue = collections.deque(tasks)
+    if concurrency <= 1:
+        while queue:
+            items, more_tasks = queue.popleft()()
+            queue.extend(more_tasks)
+            yield from items
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        while queue or pending:
+            while queue and len(pending) < concurrency * 2:
+                pending.add(executor.submit(queue.popleft()))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                items, more_tasks = future.result()
+                queue.extend(more_tasks)
+                yield from items
+
+
+class StreamedResponse(io.RawIOBase):
+    """Read-only file object over the body of a streamed response,
+    which releases the response's connection once read to the end
+    """
+
+    def __init__(self, resp):
+        self.resp = resp
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.resp.raw.read(len(b), decode_content=True)
+        if not data:
+            self.resp.close()
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.resp.close()
+        super().close()
+
+
+def fetch_task(url, media_type, type_, ident):
+    """Task requesting ``url`` as a single item"""
+    resp = session.get(url)
+    return [(io.BytesIO(resp.content), media_type, type_, ident)], []
+
+
+def stream_task(url, media_type, type_, ident):
+    """Task requesting ``url`` as a single item, where a large body
+    is streamed to the upload instead of being read into memory.
+    Without a ``media_type`` the response's Content-Type is used.
+    """
+    resp = session.get(url, stream=True)
+    media_type = media_type or resp.headers.get('Content-Type', 'application/octet-stream')
+    size = resp.headers.get('Content-Length')
+    if size is not None and int(size) <= STREAM_THRESHOLD:
+        return [(io.BytesIO(resp.content), media_type, type_, ident)], []
+    debug(f'Streaming {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal} ({size or "unknown"} bytes)')
+    return [(StreamedResponse(resp), media_type, type_, ident)], []
+
+
+def skip_nothing(type_, ident):
+    return False
+
+
 def scrape_version(id, version, host, visited_locs, book=None,
-                   is_composite_page=False):
+                   is_composite_page=False, concurrency=1, skip=None, bulk=False):
+    """Scrape a version of a book, or of a page when ``book`` is given,
+    along with its resources and pages.
+    See ``run_tasks`` for the meaning of ``concurrency``.
     """
+    task = partial(scrape_version_task, id, version, host, visited_locs,
+                   book=book, is_composite_page=is_composite_page, skip=skip, bulk=bulk)
+    yield from run_tasks([task], concurrency)
+
+
+def scrape_version_task(id, version, host, visited_locs, book=None,
+                        is_composite_page=False, skip=None, bulk=False):
+    """Task scraping a version of a book or page.
+    Only the JSON we need to find the rest of the content is requested
+    up front, everything else is left to further tasks.
+
+    Content for which ``skip(type, ident)`` is true (e.g. it was dumped
+    by an earlier run) is neither requested nor yielded; except for the
+    JSON that lists the pages and resources, which is requested regardless.
+
+    ``VersionUnavailable`` is raised, before any task or item, when
+    archive can't serve the raw or baked JSON of a book.
+
+    With ``bulk`` the baked HTML of a page isn't requested: it is the
+    ``content`` of the page's baked JSON, which archive serves as the HTML.
+    (A page whose JSON has no content has its HTML requested as usual.)
+
     """
+    if skip is None:
+        skip = skip_nothing
+    items, tasks = [], []
     if book is None:
         is_book = True
         type_ = 'book'
@@ -204,19 +717,22 @@ def scrape_version(id, version, host, visited_locs, book=None,
         format_ = 'json'
         url = f'{base_raw_url}.{format_}{raw_postfix}'
         debug(f'Requesting {temperature} JSON {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal}')
-        resp = session.get(url)
-        yield io.BytesIO(resp.content), 'application/json', f'{temperature}-{type_}-json', [ident_hash_seq[-1]]
-
-        # Save the raw json for later
-        raw_json = resp.json()
+        if is_book:
+            resp = session.get(url)
+            # Save the raw json for later
+            raw_json = book_json(resp)
+            if not skip(f'{temperature}-{type_}-json', [ident_hash_seq[-1]]):
+                items.append((io.BytesIO(resp.content), 'application/json', f'{temperature}-{type_}-json', [ident_hash_seq[-1]]))
+        elif not skip(f'{temperature}-{type_}-json', [ident_hash_seq[-1]]):
+            tasks.append(partial(fetch_task, url, 'application/json', f'{temperature}-{type_}-json', [ident_hash_seq[-1]]))
 
         # Request the RAW HTML
         temperature = 'raw'
         format_ = 'html'
         url = f'{base_raw_url}.{format_}{raw_postfix}'
-        debug(f'Requesting {temperature} HTML {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal}')
-        resp = session.get(url)
-        yield io.BytesIO(resp.content), 'text/html', f'{temperature}-{type_}-html', [ident_hash_seq[-1]]
+        if not skip(f'{temperature}-{type_}-html', [ident_hash_seq[-1]]):
+            debug(f'Requesting {temperature} HTML {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal}')
+            tasks.append(partial(fetch_task, url, 'text/html', f'{temperature}-{type_}-html', [ident_hash_seq[-1]]))
 
     # Request the BAKED JSON
     temperature = 'baked'
@@ -224,54 +740,667 @@ def scrape_version(id, version, host, visited_locs, book=None,
     url = f'{base_baked_url}.{format_}'
     debug(f'Requesting {temperature} JSON {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal}')
     resp = session.get(url)
-    yield io.BytesIO(resp.content), 'application/json', f'{temperature}-{type_}-json', ident_hash_seq
-
     # Save the baked json for later
-    baked_json = resp.json()
+    baked_json = book_json(resp) if is_book else resp.json()
+    if not skip(f'{temperature}-{type_}-json', ident_hash_seq):
+        items.append((io.BytesIO(resp.content), 'application/json', f'{temperature}-{type_}-json', ident_hash_seq))
+    resources = [(res_entity['id'], str(res_entity['media_type'])) for res_entity in baked_json['resources']]
 
     # Request the BAKED HTML
     temperature = 'baked'
     format_ = 'html'
     url = f'{base_baked_url}.html'
-    debug(f'Requesting {temperature} HTML {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal}')
-    resp = session.get(url)
-    yield io.BytesIO(resp.content), 'text/html', f'{temperature}-{type_}-html', ident_hash_seq
+    if skip(f'{temperature}-{type_}-html', ident_hash_seq):
+        pass
+    elif bulk and not is_book and isinstance(baked_json.get('content'), str):
+        # (archive serves a page's HTML as its JSON's content, as it is)
+        items.append((io.BytesIO(baked_json['content'].encode('utf-8')), 'text/html',
+                      f'{temperature}-{type_}-html', ident_hash_seq))
+    else:
+        debug(f'Requesting {temperature} HTML {T.bold}{type_}{T.normal} at {T.yellow}{url}{T.normal}')
+        tasks.append(partial(fetch_task, url, 'text/html', f'{temperature}-{type_}-html', ident_hash_seq))
 
     # Request the resources...
-    for res_entity in baked_json['resources']:
+    for sha1, media_type in resources:
+        if skip('resource', sha1) or not visited_locs.claim(sha1):
+            continue
         # Request the resource itself
-        url = f'https://{host}/resources/{res_entity["id"]}'
+        url = f'https://{host}/resources/{sha1}'
         debug(f'Requesting {T.bold}resource{T.normal} at {T.yellow}{url}{T.normal}')
-        resp = session.get(url)
-        yield io.BytesIO(resp.content), str(res_entity['media_type']), 'resource', res_entity['id']
+        tasks.append(partial(stream_task, url, media_type, 'resource', sha1))
 
     if is_book:
         # Request the individual raw pages
-        raw_pages = flatten_tree_to_ident_hashes(raw_json['tree'])
+        raw_pages = set(flatten_tree_to_ident_hashes(raw_json['tree']))
         for page_ident_hash in flatten_tree_to_ident_hashes(baked_json['tree']):
             page_id, page_version = split_ident_hash(page_ident_hash)
-            yield from scrape_version(page_id, page_version, host, visited_locs, book=(id, version,),
-                                      is_composite_page=(page_ident_hash not in raw_pages))
+            tasks.append(partial(scrape_version_task, page_id, page_version, host, visited_locs, book=(id, version,),
+                                 is_composite_page=(page_ident_hash not in raw_pages), skip=skip, bulk=bulk))
+
+    return items, tasks
+
+
+class LatestPointers:
+    """The "latest version" pointer objects of a dump
+
+    The newest version of each pointer is tracked in memory for the run:
+    ``update`` only notes it, and ``flush`` writes the pointers which
+    moved since the last flush (e.g. once per version of a book).
+    A pointer is read (to not move it back to an older version)
+    at most once a run, rather than on every upload.
+    It is safe to share between upload workers.
+
+    The processes of a ``--jobs`` dump (whose books may share raw pages)
+    serialize their writes with ``process_locks``, a list of
+    ``multiprocessing.Lock`` over which the pointers are spread, and
+    re-read the pointer under the lock, as another process may have
+    moved it since.
+
+    """
+
+    def __init__(self, gen_filepath, process_locks=None):
+        self.gen_filepath = gen_filepath
+        self.process_locks = process_locks
+        # (bucket name, pointer key) -> the version it points at, when known
+        self._versions = {}
+        # (bucket name, pointer key) -> (id, version, key) to point it at
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def _process_lock(self, pointer_key):
+        if self.process_locks is None:
+            return contextlib.nullcontext()
+        # (str hashes differ between processes)
+        return self.process_locks[zlib.crc32(pointer_key.encode('utf-8')) % len(self.process_locks)]
+
+    @staticmethod
+    def _read(target, bucket_name, pointer_key):
+        body = target.read(bucket_name, pointer_key)
+        if body is None:
+            return None
+        return json.loads(body)['version']
+
+    def update(self, bucket_name, type, ident, key):
+        """Note that the versionless "latest version" object for ``ident``
+        is to point at ``key``, unless it points at a newer version.
+        """
+        pointer_key = self.gen_filepath(type, ident, latest=True)
+        # The baked content is versioned by the book, the raw content by itself.
+        id, version = ident[0] if type.startswith('baked') else ident[-1]
+
+        with self._lock:
+            pending = self._pending.get((bucket_name, pointer_key))
+            for newest in (self._versions.get((bucket_name, pointer_key)), pending and pending[1]):
+                if newest is not None and version_key(newest) >= version_key(version):
+                    return
+            self._pending[(bucket_name, pointer_key)] = (id, version, key)
+
+    def _write(self, target, bucket_name, pointer_key, id, version, key):
+        with self._process_lock(pointer_key):
+            with self._lock:
+                known = (bucket_name, pointer_key) in self._versions
+                current_version = self._versions.get((bucket_name, pointer_key))
+            if not known or self.process_locks is not None:
+                current_version = self._read(target, bucket_name, pointer_key)
+            if current_version is not None and version_key(current_version) >= version_key(version):
+                with self._lock:
+                    self._versions[(bucket_name, pointer_key)] = current_version
+                return
+
+            debug(f'Pointing {T.blue}{pointer_key}{T.normal} in bucket "{bucket_name}" at "{T.green_bold}{key}{T.normal}"')
+            # A single PUT replaces the whole object,
+            # so readers only ever see the old or the new pointer.
+            body = json.dumps({'id': id, 'version': version, 'key': key})
+            target.write(bucket_name, pointer_key, body.encode('utf-8'),
+                         {'ContentType': 'application/json',
+                          'CacheControl': POINTER_CACHE_CONTROL})
+            with self._lock:
+                self._versions[(bucket_name, pointer_key)] = version
+                self.written += 1
+
+    def flush(self, target, workers=1):
+        """Write the pointers updated since the last flush into the ``target``,
+        ``workers`` at a time
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._write, target, bucket_name, pointer_key, *pointer)
+                       for (bucket_name, pointer_key), pointer in pending.items()]
+            for future in futures:
+                future.result()
+
+
+def bucket_label(type_):
+    """Label of the bucket (raw, baked or resources) the content type goes in"""
+    if type_.startswith('baked'):
+        return 'baked'
+    elif type_.startswith('resource'):
+        return 'resources'
+    else:
+        return 'raw'
+
+
+class DumpJournal:
+    """A local SQLite record of every object uploaded,
+    from which an interrupted dump can be resumed
+
+    Parameters
+    ----------
+    path: str
+        SQLite database file, created when it doesn't exist
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS uploads ('
+                ' bucket TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' etag TEXT NOT NULL,'
+                ' uploaded_at REAL NOT NULL,'
+                ' PRIMARY KEY (bucket, key))'
+            )
+        self._keys = set(self._conn.execute('SELECT bucket, key FROM uploads'))
+        self.skipped = 0
+
+    def __contains__(self, bucket_and_key):
+        return bucket_and_key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def skip(self, bucket, key):
+        """Has ``key`` already been uploaded to ``bucket``"""
+        if (bucket, key) in self._keys:
+            with self._lock:
+                self.skipped += 1
+            return True
+        return False
+
+    def record(self, bucket, key, size, etag):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)',
+                               (bucket, key, size, etag, time.time()))
+            self._keys.add((bucket, key))
+
+    def entries(self):
+        """Yield the bucket, key, size and ETag of every recorded upload"""
+        with self._lock:
+            rows = self._conn.execute('SELECT bucket, key, size, etag FROM uploads ORDER BY bucket, key').fetchall()
+        yield from rows
+
+    def verify(self, s3_client):
+        """Compare the journal against the buckets, listing each bucket
+        rather than checking every object on its own.
+        Yields the bucket, key and problem of each mismatched object.
+        """
+        for bucket, entries in itertools.groupby(self.entries(), key=lambda e: e[0]):
+            entries = list(entries)
+            prefix = os.path.commonprefix([key for _, key, _, _ in entries])
+            stored = {}
+            paginator = s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                for obj in page.get('Contents', []):
+                    stored[obj['Key']] = (obj['Size'], obj['ETag'])
+            for _, key, size, etag in entries:
+                if key not in stored:
+                    yield bucket, key, 'missing'
+                elif stored[key] != (size, etag):
+                    yield bucket, key, (f'expected {size} bytes with ETag {etag}, '
+                                        f'found {stored[key][0]} bytes with ETag {stored[key][1]}')
+
+
+class TransferStats:
+    """Running totals of the objects and bytes dumped into each bucket"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.objects = collections.Counter()
+        self.bytes = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # (sent back by the processes of a --jobs dump)
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
 
+    def add(self, label, nbytes):
+        with self._lock:
+            self.bytes[label] += nbytes
+
+    def done(self, label):
+        with self._lock:
+            self.objects[label] += 1
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    def merge(self, other):
+        """Add the totals of ``other`` (e.g. of a book) to these"""
+        with self._lock:
+            self.objects.update(other.objects)
+            self.bytes.update(other.bytes)
+
+    def summary(self):
+        elapsed = max((self.finished or time.monotonic()) - self.started, 1e-6)
+        for label in ('raw', 'baked', 'resources'):
+            mb = self.bytes[label] / MB
+            yield (f'{label:>9}: {self.objects[label]} objects, {mb:.1f} MB '
+                   f'({mb / elapsed:.2f} MB/s)')
+        mb = sum(self.bytes.values()) / MB
+        yield (f'{"total":>9}: {sum(self.objects.values())} objects, {mb:.1f} MB '
+               f'in {elapsed:.1f}s ({mb / elapsed:.2f} MB/s)')
+
+
+class S3Target:
+    """Uploads the dumped objects into their buckets"""
+
+    # (S3 keeps the Content-Type of each object)
+    sidecars = False
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+
+    def put(self, bucket_name, key, data, extra_args, callback=None):
+        self.s3_client.upload_fileobj(data, bucket_name, key, ExtraArgs=extra_args,
+                                      Callback=callback, Config=TRANSFER_CONFIG)
+
+    def read(self, bucket_name, key):
+        """The body of a small object, or ``None`` when there is none"""
+        try:
+            resp = self.s3_client.get_object(Bucket=bucket_name, Key=key)
+        except ClientError as exc:
+            if exc.response['Error']['Code'] != 'NoSuchKey':
+                raise
+            return None
+        return resp['Body'].read()
+
+    def write(self, bucket_name, key, body, extra_args):
+        """Write a small object, e.g. a pointer, which may be rewritten"""
+        self.s3_client.put_object(Bucket=bucket_name, Key=key, Body=body, **extra_args)
+
+    def close(self):
+        pass
+
+
+class DirectoryTarget:
+    """Writes the dumped objects into a local directory, at ``{path}/{key}``,
+    to be staged, inspected or synced into a bucket.
+
+    The Content-Type of each resource, which can't be told from its key,
+    is written next to it (see the ``resource-media-type`` filepath).
+
+    """
+
+    sidecars = True
+
+    def __init__(self, path):
+        self.path = path
+
+    def _path(self, key):
+        return os.path.join(self.path, *key.split('/'))
+
+    def put(self, bucket_name, key, data, extra_args, callback=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside then renamed, so a file is either complete or missing
+        # (the processes of a --jobs dump may write the same raw page)
+        tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = data.read(MB)
+                if not chunk:
+                    break
+                f.write(chunk)
+                if callback is not None:
+                    callback(len(chunk))
+        os.replace(tmp_path, path)
+
+    def read(self, bucket_name, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, bucket_name, key, body, extra_args):
+        self.put(bucket_name, key, io.BytesIO(body), extra_args)
+
+    def close(self):
+        pass
+
+
+class TarTarget:
+    """Streams the dumped objects into a tar archive, as ``{key}`` members,
+    with the resources' Content-Type sidecars like ``DirectoryTarget``.
+
+    Small objects which may be rewritten (the "latest version" pointers
+    and the sidecars) are kept until the archive is closed,
+    so that each is archived once.
+
+    """
 
-def dump_in_bucket(items, raw_bucket_name, baked_bucket_name, resources_bucket_name, region, gen_filepath):
-    s3 = boto3.resource('s3', region_name=region)
-    raw_bucket = s3.Bucket(raw_bucket_name)
-    baked_bucket = s3.Bucket(baked_bucket_name)
-    resources_bucket = s3.Bucket(resources_bucket_name)
+    sidecars = True
 
-    for item in items:
+    def __init__(self, fileobj, compression='', close_fileobj=False):
+        self.fileobj = fileobj
+        self.close_fileobj = close_fileobj
+        self._tar = tarfile.open(fileobj=fileobj, mode=f'w|{compression}')
+        self._lock = threading.Lock()
+        self._small = {}
+
+    def _add(self, key, data, size):
+        member = tarfile.TarInfo(key)
+        member.size = size
+        member.mtime = time.time()
+        member.mode = 0o644
+        with self._lock:
+            self._tar.addfile(member, data)
+
+    def put(self, bucket_name, key, data, extra_args, callback=None):
+        if data.seekable():
+            size = data.seek(0, io.SEEK_END)
+            data.seek(0)
+            self._add(key, data, size)
+        else:
+            # A member's size comes before its data, so a streamed
+            # resource is spooled (to disk when large) to find it out.
+            with tempfile.SpooledTemporaryFile(max_size=STREAM_THRESHOLD) as spool:
+                shutil.copyfileobj(data, spool, MB)
+                size = spool.tell()
+                spool.seek(0)
+                self._add(key, spool, size)
+        if callback is not None:
+            callback(size)
+
+    def read(self, bucket_name, key):
+        with self._lock:
+            return self._small.get(key)
+
+    def write(self, bucket_name, key, body, extra_args):
+        with self._lock:
+            self._small[key] = body
+
+    def close(self):
+        for key, body in sorted(self._small.items()):
+            self._add(key, io.BytesIO(body), len(body))
+        self._tar.close()
+        if self.close_fileobj:
+            self.fileobj.close()
+        else:
+            self.fileobj.flush()
+
+
+def open_export(path):
+    """The target of ``--export``: a tar archive when ``path`` ends with
+    ``.tar``, ``.tar.gz`` or ``.tgz`` (or is ``-``, for stdout),
+    or else a directory
+    """
+    if path == '-':
+        return TarTarget(sys.stdout.buffer)
+    for suffix, compression in (('.tar', ''), ('.tar.gz', 'gz'), ('.tgz', 'gz')):
+        if path.endswith(suffix):
+            return TarTarget(open(path, 'wb'), compression, close_fileobj=True)
+    return DirectoryTarget(path)
+
+
+def dump_in_bucket(items, raw_bucket_name, baked_bucket_name, resources_bucket_name, region, gen_filepath,
+                   upload_workers=4, queue_size=32, journal=None, precompress=(),
+                   cache_control=PINNED_CACHE_CONTROL, target=None, process_locks=None,
+                   resources=None, pointers=None):
+    """Upload the scraped ``items`` into the buckets.
+
+    Items are put on a queue of at most ``queue_size`` items, which is
+    drained by ``upload_workers`` threads. When the uploads fall behind,
+    the queue fills up and holds back the scraping, capping memory use.
+
+    Every upload is recorded in the ``journal`` (a ``DumpJournal``) if given,
+    and every resource uploaded is registered as dumped in ``resources``
+    (the ``ResourceRegistry`` of the scraping) if given.
+
+    For each of the ``precompress`` encodings (see ``PRECOMPRESSORS``)
+    a compressed sibling of every HTML and JSON object is uploaded as well,
+    before the object itself.
+
+    The objects are stored with the ``cache_control`` Cache-Control,
+    which CloudFront passes on when serving them.
+
+    The objects are uploaded into the buckets, unless another ``target``
+    (e.g. a ``DirectoryTarget``) is given, see ``open_export``.
+
+    The "latest version" pointers of the uploads are kept by ``pointers``
+    (the ``LatestPointers`` of the run, else of this dump, see there for
+    ``process_locks``) and written at the end of each version, and of the dump.
+
+    The marker of a ``version_done`` item is only written once everything
+    before it (pointers included) has been dumped, so that a version is never
+    marked as dumped (see ``ExistingContent.skip_version``) when the dump
+    stopped partway.
+
+    Returns the ``TransferStats`` of the dump.
+
+    """
+    client = boto3.client('s3', region_name=region, config=botocore.config.Config(
+        max_pool_connections=upload_workers * TRANSFER_CONFIG.max_request_concurrency))
+    if target is None:
+        target = S3Target(client)
+    if pointers is None:
+        pointers = LatestPointers(gen_filepath, process_locks)
+    stats = TransferStats()
+    queue = Queue(maxsize=queue_size)
+    errors = []
+
+    bucket_names = {
+        'raw': raw_bucket_name,
+        'baked': baked_bucket_name,
+        'resources': resources_bucket_name,
+    }
+
+    def put(label, key, data, extra_args):
+        bucket_name = bucket_names[label]
+        target.put(bucket_name, key, data, extra_args, callback=partial(stats.add, label))
+        stats.done(label)
+        if journal is not None:
+            head = client.head_object(Bucket=bucket_name, Key=key)
+            journal.record(bucket_name, key, head['ContentLength'], head['ETag'])
+
+    def upload(item):
         data, media_type, type, ident = item
         key = gen_filepath(type, ident)
-        if type.startswith('baked'):
-            debug(f'Dumping {T.blue}{type}{T.normal} into bucket "{baked_bucket_name}" at "{T.green_bold}{key}{T.normal}" ({media_type})')
-            baked_bucket.upload_fileobj(data, key, ExtraArgs={'ContentType': media_type})
-        elif type.startswith('resource'):
-            debug(f'Dumping {T.blue}{type}{T.normal} into bucket "{resources_bucket_name}" at "{T.green_bold}{key}{T.normal}" ({media_type})')
-            resources_bucket.upload_fileobj(data, key, ExtraArgs={'ContentType': media_type})
+        label = bucket_label(type)
+        bucket_name = bucket_names[label]
+        debug(f'Dumping {T.blue}{type}{T.normal} into bucket "{bucket_name}" at "{T.green_bold}{key}{T.normal}" ({media_type})')
+        # The siblings go first, so that an object in the bucket
+        # (or in the journal) has its siblings there as well.
+        if precompress and key.endswith(PRECOMPRESSED_FORMATS):
+            content = data.getvalue()
+            for encoding in precompress:
+                extension, compress = PRECOMPRESSORS[encoding]
+                debug(f'Dumping {T.blue}{type}{T.normal} ({encoding}) into bucket "{bucket_name}" at "{T.green_bold}{key}{extension}{T.normal}"')
+                put(label, f'{key}{extension}', io.BytesIO(compress(content)),
+                    {'ContentType': media_type, 'ContentEncoding': encoding,
+                     'CacheControl': cache_control})
+        put(label, key, data, {'ContentType': media_type, 'CacheControl': cache_control})
+        if label != 'resources':
+            pointers.update(bucket_name, type, ident, key)
         else:
-            debug(f'Dumping {T.blue}{type}{T.normal} into bucket "{raw_bucket_name}" at "{T.green_bold}{key}{T.normal}" ({media_type})')
-            raw_bucket.upload_fileobj(data, key, ExtraArgs={'ContentType': media_type})
+            if target.sidecars:
+                target.write(bucket_name, gen_filepath('resource-media-type', ident),
+                             media_type.encode('utf-8'), {'ContentType': 'text/plain'})
+            if resources is not None:
+                resources.dumped(ident)
+
+    def worker():
+        while True:
+            item = queue.get()
+            try:
+                if item is None:
+                    return
+                # Once anything has failed the rest is only drained,
+                # so that the scraping doesn't block on a full queue.
+                if not errors:
+                    upload(item)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                queue.task_done()
+
+    workers = [threading.Thread(target=worker, daemon=True) for i in range(upload_workers)]
+    for thread in workers:
+        thread.start()
+    try:
+        for item in items:
+            if errors:
+                break
+            data, media_type, type, ident = item
+            if type == 'baked-book-done':
+                queue.join()
+                if not errors:
+                    pointers.flush(target, upload_workers)
+                    target.write(baked_bucket_name, gen_filepath(type, ident), data.getvalue(),
+                                 {'ContentType': media_type})
+                continue
+            queue.put(item)
+    finally:
+        for thread in workers:
+            queue.put(None)
+        for thread in workers:
+            thread.join()
+        # (those of the objects uploaded, even when the dump failed)
+        pointers.flush(target, upload_workers)
+    if errors:
+        raise errors[0]
+
+    stats.finish()
+    return stats
+
+
+class BookDumper:
+    """Dumps books one after the other into the buckets (or the ``target``),
+    with what the books share: the ``resources`` (a ``ResourceRegistry``),
+    the ``journal`` and the content found in the buckets (``incremental``).
+
+    Each process of a ``--jobs`` dump has its own (see ``init_job``).
+
+    """
+
+    def __init__(self, host, region, bucket_names, prefixes, filepath, resources,
+                 concurrency=1, upload_workers=4, queue_size=32, journal=None,
+                 incremental=False, all_versions=False, precompress=(),
+                 cache_control=PINNED_CACHE_CONTROL, bulk=False, target=None, process_locks=None):
+        self.host = host
+        self.region = region
+        self.bucket_names = bucket_names
+        self.filepath = filepath
+        self.resources = resources
+        self.concurrency = concurrency
+        self.upload_workers = upload_workers
+        self.queue_size = queue_size
+        self.journal = journal
+        self.all_versions = all_versions
+        self.precompress = precompress
+        self.cache_control = cache_control
+        self.bulk = bulk
+        self.target = target
+        # Shared by the books, so each pointer is read once a run
+        self.pointers = LatestPointers(filepath, process_locks)
+
+        self.skips = []
+        if journal is not None:
+            self.skips.append(self.journaled)
+        self.existing = None
+        if incremental:
+            self.existing = ExistingContent(boto3.client('s3', region_name=region), bucket_names, prefixes, filepath,
+                                            precompress)
+            self.skips.append(self.existing.skip)
+
+    def journaled(self, type_, ident):
+        """Has the content been uploaded, along with its precompressed
+        siblings (which a run without ``precompress`` didn't upload)
+        """
+        bucket_name = self.bucket_names[bucket_label(type_)]
+        key = self.filepath(type_, ident)
+        return (all((bucket_name, sibling) in self.journal
+                    for sibling in precompressed_keys(key, self.precompress))
+                and self.journal.skip(bucket_name, key))
+
+    def skip(self, type_, ident):
+        return any(f(type_, ident) for f in self.skips)
+
+    def skipped_counts(self):
+        return (self.resources.skipped,
+                self.journal.skipped if self.journal is not None else 0,
+                self.existing.skipped if self.existing else 0,
+                self.existing.versions_skipped if self.existing else 0)
+
+    def dump(self, book):
+        """Dump the ``book``, returning its ``TransferStats`` and the lines
+        summing up what was dumped and what was avoided
+        """
+        before = self.skipped_counts()
+        unavailable = []
+        try:
+            stats = dump_in_bucket(scrape(book, self.host, visited_locs=self.resources,
+                                          concurrency=self.concurrency,
+                                          skip=self.skip if self.skips else None,
+                                          all_versions=self.all_versions,
+                                          skip_version=self.existing and self.existing.skip_version,
+                                          bulk=self.bulk, unavailable=unavailable),
+                                   self.bucket_names['raw'], self.bucket_names['baked'],
+                                   self.bucket_names['resources'], self.region, self.filepath,
+                                   upload_workers=self.upload_workers, queue_size=self.queue_size,
+                                   journal=self.journal, precompress=self.precompress,
+                                   cache_control=self.cache_control, target=self.target,
+                                   resources=self.resources, pointers=self.pointers)
+        except BaseException:
+            # So that the other books dump the resources this one didn't
+            self.resources.release()
+            raise
+        resources_skipped, journaled, existed, versions_skipped = (
+            after - before for after, before in zip(self.skipped_counts(), before))
+        summary = list(stats.summary())
+        summary.append(f'{T.bold}{book}{T.normal}: {resources_skipped + journaled + existed} requests avoided '
+                       f'({resources_skipped} resources already dumped, {journaled} journaled, '
+                       f'{existed} already in the buckets), '
+                       f'{versions_skipped} versions already in the buckets, '
+                       f'{len(unavailable)} versions archive couldn\'t serve')
+        if unavailable:
+            summary.append(f'{T.red}Not dumped{T.normal}: '
+                           f'{" ".join(join_ident_hash(*ident) for ident in unavailable)}')
+        return stats, summary
+
+
+# The ``BookDumper`` of a ``--jobs`` worker process
+JOB_DUMPER = None
+
+
+def init_job(verbose, concurrency, rate_limiter, journal_path, options):
+    """Set up a ``--jobs`` worker process, with the ``options``
+    of its ``BookDumper`` (which are shared with the other processes)
+    """
+    global VERBOSE, JOB_DUMPER
+    VERBOSE = verbose
+    configure_session(concurrency, rate_limiter)
+    journal = DumpJournal(journal_path) if journal_path else None
+    JOB_DUMPER = BookDumper(concurrency=concurrency, journal=journal, **options)
+
+
+def dump_job(book):
+    return JOB_DUMPER.dump(book)
 
 
 @click.command()
@@ -282,18 +1411,90 @@ def dump_in_bucket(items, raw_bucket_name, baked_bucket_name, resources_bucket_n
 @click.option('--baked-bucket', help='The s3 bucket to store baked content')
 @click.option('--resources-bucket', help='The s3 bucket to store resources')
 @click.option('--bucket', help='A single s3 bucket to store content and resources')
+@click.option('--concurrency', default=1, show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of concurrent requests made to archive')
+@click.option('--upload-workers', default=4, show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of concurrent uploads to s3')
+@click.option('--queue-size', default=32, show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of scraped items waiting for upload before scraping pauses')
+@click.option('--skip-existing-resources/--no-skip-existing-resources', default=True,
+              show_default=True,
+              help='Skip the resources already in the resources bucket')
+@click.option('--journal', type=click.Path(dir_okay=False),
+              help='SQLite file recording the uploads, to resume an interrupted dump from')
+@click.option('--verify', is_flag=True,
+              help='Check the uploads recorded in the journal against the buckets, then exit')
+@click.option('--all-versions', is_flag=True,
+              help='Dump the historical versions of the books as well as the latest')
+@click.option('--incremental', is_flag=True,
+              help='Only dump the versions and pages not already in the buckets')
+@click.option('--precompress', multiple=True,
+              type=click.Choice(['gzip', 'br']),
+              help='Also upload HTML and JSON compressed with this Content-Encoding '
+                   '(br requires the brotli package)')
+@click.option('--cache-control', default=PINNED_CACHE_CONTROL, show_default=True,
+              help='Cache-Control of the dumped (version pinned) content')
+@click.option('--layout', default='ident-hash', show_default=True,
+              type=click.Choice(LAYOUTS),
+              help='Layout of the raw and baked keys, "inverted" lists the newest version first')
+@click.option('--jobs', default=1, show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of books dumped at once, each by its own process')
+@click.option('--rate-limit', type=click.FloatRange(min=0, min_open=True),
+              help='Most requests a second made to archive, across all the jobs')
+@click.option('--bulk', is_flag=True,
+              help="Take the pages' baked HTML from their baked JSON rather than requesting it")
+@click.option('--export', metavar='PATH',
+              help='Write the content into a local directory in the layout of a single bucket, '
+                   'or into a tar archive (PATH ending with .tar, .tar.gz or .tgz, '
+                   'or - for stdout), instead of the buckets')
 @click.argument('region', default='us-west-2')
-def main(verbose, book, host, raw_bucket, baked_bucket, resources_bucket, bucket, region):
+def main(verbose, book, host, raw_bucket, baked_bucket, resources_bucket, bucket, concurrency,
+         upload_workers, queue_size, skip_existing_resources, journal, verify,
+         all_versions, incremental, precompress, cache_control, layout, jobs, rate_limit, bulk,
+         export, region):
     global VERBOSE
     VERBOSE = verbose
+    rate_limiter = rate_limit and RateLimiter(rate_limit)
+    configure_session(concurrency, rate_limiter)
+    journal_path = journal
+    if journal:
+        journal = DumpJournal(journal)
+        info(f'{len(journal)} uploads recorded in journal "{journal.path}"')
+    if verify:
+        if not journal:
+            raise click.UsageError("--verify requires the --journal option")
+        problems = 0
+        for bucket_name, key, problem in journal.verify(boto3.client('s3', region_name=region)):
+            info(f'{T.red}{bucket_name}/{key}{T.normal}: {problem}')
+            problems += 1
+        info(f'{problems} problems found in {len(journal)} journaled uploads')
+        sys.exit(problems and 1)
+
+    for encoding in precompress:
+        if encoding not in PRECOMPRESSORS:
+            raise click.UsageError(f"--precompress {encoding} requires the brotli package")
+
     books = book
     if not books:
         raise click.UsageError(
             "At least one book must be supplied\n"
             "See the --book option"
         )
-    if bucket:
-        raw_bucket = baked_bucket = resources_bucket = bucket
+    target = None
+    if export:
+        if journal is not None or incremental:
+            raise click.UsageError("--export can't be combined with --journal or --incremental")
+        # Nothing is read from the buckets
+        skip_existing_resources = False
+        target = open_export(export)
+        if jobs > 1 and isinstance(target, TarTarget):
+            raise click.UsageError("--jobs can't export into a tar archive, export into a directory")
+    if export or bucket:
+        raw_bucket = baked_bucket = resources_bucket = bucket or export
         raw_prefix = 'raw/'
         baked_prefix = 'baked/'
         resource_prefix = 'resources/'
@@ -306,13 +1507,92 @@ def main(verbose, book, host, raw_bucket, baked_bucket, resources_bucket, bucket
                 "All destination buckets (raw, baked, resources) needs to be different from eachother"
             )
 
-    for book in books:
-        dump_in_bucket(scrape(book, host), raw_bucket, baked_bucket,
-                       resources_bucket, region,
-                       partial(gen_filepath, raw_prefix=raw_prefix,
-                               baked_prefix=baked_prefix,
-                               resource_prefix=resource_prefix))
+    filepath = partial(gen_filepath, raw_prefix=raw_prefix,
+                       baked_prefix=baked_prefix,
+                       resource_prefix=resource_prefix,
+                       layout=layout)
+    options = {
+        'host': host,
+        'region': region,
+        'bucket_names': {'raw': raw_bucket, 'baked': baked_bucket, 'resources': resources_bucket},
+        'prefixes': {'raw': raw_prefix, 'baked': baked_prefix, 'resources': resource_prefix},
+        'filepath': filepath,
+        'upload_workers': upload_workers,
+        'queue_size': queue_size,
+        'incremental': incremental,
+        'all_versions': all_versions,
+        'precompress': precompress,
+        'cache_control': cache_control,
+        'bulk': bulk,
+        'target': target,
+    }
+    total = TransferStats()
+
+    def report(stats, summary, prefix=''):
+        for line in summary:
+            info(f'{prefix}{line}')
+        total.merge(stats)
 
+    try:
+        if jobs == 1:
+            # Shared between the books, so their common resources are dumped once
+            resources = ResourceRegistry()
+            if skip_existing_resources:
+                resources.load(boto3.client('s3', region_name=region), resources_bucket, resource_prefix)
+                info(f'{len(resources)} resources already in bucket "{resources_bucket}"')
+            dumper = BookDumper(resources=resources, concurrency=concurrency, journal=journal, **options)
+            for book in books:
+                report(*dumper.dump(book))
+        else:
+            failed = dump_jobs(books, jobs, verbose, concurrency, rate_limiter, journal_path,
+                               skip_existing_resources, options, report)
+    finally:
+        if target is not None:
+            target.close()
+    if len(books) > 1:
+        total.finish()
+        info(f'{T.bold}{len(books)} books{T.normal}:')
+        for line in total.summary():
+            info(line)
+    if jobs > 1 and failed:
+        info(f'{T.red}{len(failed)} books failed{T.normal}: {" ".join(failed)}')
+        sys.exit(1)
+
+
+def dump_jobs(books, jobs, verbose, concurrency, rate_limiter, journal_path,
+              skip_existing_resources, options, report):
+    """Dump the ``books`` with ``jobs`` processes, reporting each book's
+    stats and summary as it is done. Returns the books that failed.
+
+    The processes share the registry of the resources dumped and the
+    rate limit, and serialize their updates of the latest version
+    pointers. Each one opens the journal, and lists the buckets for
+    an incremental dump, on its own.
+
+    """
+    with multiprocessing.Manager() as manager:
+        resources = ResourceRegistry(manager.dict(), multiprocessing.Lock())
+        if skip_existing_resources:
+            resources.load(boto3.client('s3', region_name=options['region']),
+                           options['bucket_names']['resources'], options['prefixes']['resources'])
+            info(f'{len(resources)} resources already in bucket "{options["bucket_names"]["resources"]}"')
+        options = dict(options, resources=resources,
+                       process_locks=[multiprocessing.Lock() for i in range(64)])
+        failed = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_job,
+                                 initargs=(verbose, concurrency, rate_limiter, journal_path, options)) as executor:
+            futures = {executor.submit(dump_job, book): book for book in books}
+            for done, future in enumerate(as_completed(futures), 1):
+                book = futures[future]
+                prefix = f'[{done}/{len(books)}] '
+                try:
+                    stats, summary = future.result()
+                except Exception as exc:
+                    info(f'{prefix}{T.red}{book}{T.normal}: {exc!r}')
+                    failed.append(book)
+                    continue
+                report(stats, summary, prefix)
+        return failed
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""\
+This copies a bucket dumped with the ident-hash key layout into another
+bucket in the inverted layout (see ``dump-to-bucket.py --layout``),
+in which S3 lists the newest version of the content first:
+
+- ``{uuid}@{version}.{format}`` is copied to ``{uuid}@{inverted version}.{format}``
+  (likewise the precompressed siblings and the book's pages)
+- the "latest version" pointers are rewritten to point at the inverted keys
+- anything else (e.g. the resources) is copied as it is
+
+The objects are copied server-side, so nothing but the pointers goes
+through this machine. Keys already in the destination bucket are skipped,
+so an interrupted migration is resumed by running it again. The pointers,
+which move with every new version, are rewritten whenever they changed.
+
+"""
+import importlib.util
+import json
+import os
+import sys
+import threading
+
+import boto3
+import botocore.config
+import click
+from botocore.exceptions import ClientError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# (``dump-to-bucket`` isn't importable by name)
+_spec = importlib.util.spec_from_file_location('dump_to_bucket', os.path.join(HERE, 'dump-to-bucket.py'))
+dump = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dump)
+
+T = dump.T
+info = dump.info
+debug = dump.debug
+
+# The key of the inverted layout for a key of the ident-hash layout
+invert_key = dump.version_index.invert_key
+
+# Some sanity tests...
+assert invert_key('raw/abc123@1.1.json') == 'raw/abc123@9997.9997.9999.json'
+assert invert_key('baked/abc123@1.10:def456@9.html.gz') == 'baked/abc123@9997.9988.9999:def456@9989.9999.9999.html.gz'
+assert invert_key('baked/abc123@1.1:def456.json') == 'baked/abc123@9997.9997.9999:def456.json'
+assert invert_key('baked/latest/abc123:def456.html') == 'baked/latest/abc123:def456.html'
+assert invert_key('resources/deadbeef-media-type') == 'resources/deadbeef-media-type'
+assert invert_key('baked/done/abc123@1.1') == 'baked/done/abc123@9997.9997.9999'
+
+
+def is_pointer(key):
+    return key.split('/')[-2:-1] == ['latest']
+
+assert is_pointer('raw/latest/abc123.json')
+assert is_pointer('latest/abc123:def456.html')
+assert not is_pointer('raw/abc123@1.1.json')
+
+
+class Migration:
+    """Copies the objects of the ``source`` bucket into the ``destination``
+    bucket in the inverted layout, skipping the keys already there
+    (except for the pointers, which are compared)
+
+    """
+
+    def __init__(self, s3_client, source, destination):
+        self.s3_client = s3_client
+        self.source = source
+        self.destination = destination
+        self.counts = {'copied': 0, 'rewritten': 0, 'skipped': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._existing = set()
+
+    def load(self, prefix=''):
+        """List the keys already in the destination bucket, returning their number"""
+        before = len(self._existing)
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.destination, Prefix=prefix):
+            self._existing.update(obj['Key'] for obj in page.get('Contents', []))
+        return len(self._existing) - before
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def list_task(self, prefix, token=None):
+        """A ``dump.run_tasks`` task listing a page of the source bucket,
+        with the tasks to migrate its keys and to list the next page
+        """
+        def task():
+            kwargs = {'Bucket': self.source, 'Prefix': prefix}
+            if token is not None:
+                kwargs['ContinuationToken'] = token
+            page = self.s3_client.list_objects_v2(**kwargs)
+            tasks = [self.migrate_task(obj['Key']) for obj in page.get('Contents', [])]
+            if page.get('IsTruncated'):
+                tasks.append(self.list_task(prefix, page['NextContinuationToken']))
+            return [], tasks
+        return task
+
+    def migrate_task(self, key):
+        def task():
+            return [self.migrate(key)], []
+        return task
+
+    def migrate(self, key):
+        """Migrate the object at ``key``, returning the outcome"""
+        try:
+            new_key = invert_key(key)
+        except ValueError as exc:
+            info(f'{T.red}{key}{T.normal}: {exc}')
+            self._count('failed')
+            return 'failed'
+        try:
+            if is_pointer(key):
+                outcome = 'rewritten' if self.rewrite_pointer(key) else 'skipped'
+            elif new_key in self._existing:
+                outcome = 'skipped'
+            else:
+                outcome = 'copied'
+                debug(f'Copying {T.blue}{key}{T.normal} to "{T.green_bold}{new_key}{T.normal}"')
+                # A managed copy, in parts for the objects over the 5 GB
+                # a single copy is limited to (e.g. videos); the object's
+                # metadata, e.g. its Content-Type, is copied along.
+                self.s3_client.copy({'Bucket': self.source, 'Key': key}, self.destination, new_key,
+                                    Config=dump.TRANSFER_CONFIG)
+        except ClientError as exc:
+            info(f'{T.red}{key}{T.normal}: {exc}')
+            outcome = 'failed'
+        self._count(outcome)
+        return outcome
+
+    def rewrite_pointer(self, key):
+        """Rewrite the pointer at ``key`` into the destination bucket, unless
+        it is there already (e.g. the source's didn't move since the last
+        migration), returning whether it was rewritten
+        """
+        resp = self.s3_client.get_object(Bucket=self.source, Key=key)
+        pointer = json.load(resp['Body'])
+        pointer['key'] = invert_key(pointer['key'])
+        if key in self._existing:
+            current = json.load(self.s3_client.get_object(Bucket=self.destination, Key=key)['Body'])
+            if current == pointer:
+                return False
+        debug(f'Pointing {T.blue}{key}{T.normal} at "{T.green_bold}{pointer["key"]}{T.normal}"')
+        self.s3_client.put_object(Bucket=self.destination, Key=key,
+                                  Body=json.dumps(pointer).encode('utf-8'),
+                                  ContentType='application/json',
+                                  CacheControl=resp.get('CacheControl', dump.POINTER_CACHE_CONTROL))
+        return True
+
+
+@click.command()
+@click.option('-v', '--verbose', is_flag=True, help='Enables verbose mode')
+@click.option('--prefix', multiple=True,
+              help='Only migrate the keys with this prefix (e.g. raw/), as many times as needed')
+@click.option('--workers', default=16, show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of concurrent copies')
+@click.argument('source')
+@click.argument('destination')
+@click.argument('region', default='us-west-2')
+def main(verbose, prefix, workers, source, destination, region):
+    dump.VERBOSE = verbose
+    if source.lower() == destination.lower():
+        raise click.UsageError("The destination bucket needs to be different from the source bucket")
+
+    client = boto3.client('s3', region_name=region, config=botocore.config.Config(
+        max_pool_connections=workers * dump.TRANSFER_CONFIG.max_request_concurrency))
+    migration = Migration(client, source, destination)
+    prefixes = prefix or ('',)
+    info(f'{sum(migration.load(p) for p in prefixes)} keys already in bucket "{destination}"')
+
+    for i, outcome in enumerate(dump.run_tasks([migration.list_task(p) for p in prefixes],
+                                               concurrency=workers), 1):
+        if i % 10000 == 0:
+            info(f'{i} keys migrated')
+    counts = migration.counts
+    info(f'{T.bold}{source}{T.normal} -> {T.bold}{destination}{T.normal}: '
+         f'{counts["copied"]} copied, {counts["rewritten"]} pointers rewritten, '
+         f'{counts["skipped"]} already migrated, {counts["failed"]} failed')
+    sys.exit(counts['failed'] and 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import importlib.util
+import io
+import json
+import os
+import sys
+
+import boto3
+import pytest
+import requests
+from moto import mock_aws
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+HOST = 'archive.example.org'
+REGION = 'us-east-1'
+BUCKETS = {'raw': 'raw-bucket', 'baked': 'baked-bucket', 'resources': 'resources-bucket'}
+PREFIXES = {'raw': '', 'baked': '', 'resources': ''}
+
+
+@pytest.fixture(scope='session')
+def dump():
+    """The dump-to-bucket.py module (whose name can't be imported)"""
+    spec = importlib.util.spec_from_file_location('dump_to_bucket', os.path.join(HERE, '..', 'dump-to-bucket.py'))
+    module = importlib.util.module_from_spec(spec)
+    # (so that what it pickles, e.g. for --jobs, can be unpickled)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeArchive(requests.adapters.BaseAdapter):
+    """Answers the requests to archive with the ``responses``
+    (by path, e.g. ``/contents/{uuid}.json``), 404 otherwise,
+    recording the paths requested
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.responses = {}
+        self.requested = []
+
+    def add(self, path, body, media_type='application/json', status=200):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.responses[path] = (status, media_type, body)
+
+    def add_book(self, id, version, pages, history=(), sha1='ab' * 20):
+        """Add a version of a book, with its ``pages`` (uuids, at version 1)
+        which all use the resource ``sha1``, and the ``history`` of the book
+        (its versions, newest first) when it is the latest
+        """
+        resources = [{'id': sha1, 'media_type': 'image/png'}]
+        contents = [{'id': f'{page}@1', 'title': f'Page {i}'} for i, page in enumerate(pages)]
+        tree = {'id': f'{id}@{version}', 'title': 'Book', 'contents': contents}
+        self.add(f'/contents/{id}.json', {'id': id, 'version': version,
+                                          'history': [{'version': v} for v in history]})
+        self.add(f'/contents/{id}@{version}.json?as_collated=0', {'id': id, 'version': version, 'tree': tree})
+        self.add(f'/contents/{id}@{version}.html?as_collated=0', b'<html>raw book</html>', 'text/html')
+        page_contents = {}
+        for i, page in enumerate(pages):
+            content = (f'<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Page {i}</title>'
+                       f'<meta name="version" content="1"/></head><body>'
+                       f'<div data-type="page" id="page_{page}"><img src="/resources/{sha1}"/></div>'
+                       f'</body></html>')
+            page_contents[page] = content
+            self.add(f'/contents/{page}@1.json?as_collated=0', {'id': page, 'version': '1'})
+            self.add(f'/contents/{page}@1.html?as_collated=0', b'<html>raw page</html>', 'text/html')
+            self.add(f'/contents/{id}@{version}:{page}.json',
+                     {'id': page, 'version': '1', 'title': f'Page {i}', 'content': content,
+                      'abstract': 'An abstract', 'license': {'code': 'by'}, 'resources': resources})
+            self.add(f'/contents/{id}@{version}:{page}.html', content.encode('utf-8'), 'text/html')
+        self.add(f'/contents/{id}@{version}.json', {'id': id, 'version': version, 'tree': tree,
+                                                    'resources': resources})
+        book_html = ('<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+                     + ''.join(f'<div data-type="page" id="page_{page}"><img src="/resources/{sha1}"/></div>'
+                               for page in pages)
+                     + '</body></html>')
+        self.add(f'/contents/{id}@{version}.html', book_html.encode('utf-8'), 'text/html')
+        self.add(f'/resources/{sha1}', b'png', 'image/png')
+
+    def send(self, request, **kwargs):
+        path = request.path_url
+        self.requested.append(path)
+        status, media_type, body = self.responses.get(path, (404, 'text/plain', b'Not Found'))
+        resp = requests.Response()
+        resp.status_code = status
+        resp.url = request.url
+        resp.request = request
+        resp.headers['Content-Type'] = media_type
+        resp.headers['Content-Length'] = str(len(body))
+        resp.raw = io.BytesIO(body)
+        return resp
+
+    def close(self):
+        pass
+
+
+@pytest.fixture()
+def archive(dump, monkeypatch):
+    adapter = FakeArchive()
+    configure_session = dump.configure_session
+    dump.session.mount('https://', adapter)
+    # (which ``main`` calls, and would mount the actual adapter)
+    monkeypatch.setattr(dump, 'configure_session', lambda *args, **kwargs: None)
+    yield adapter
+    configure_session()
+
+
+@pytest.fixture()
+def s3(monkeypatch):
+    """An S3 client of a mocked S3, in which the ``BUCKETS`` exist"""
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', REGION)
+    with mock_aws():
+        client = boto3.client('s3', region_name=REGION)
+        for bucket_name in BUCKETS.values():
+            client.create_bucket(Bucket=bucket_name)
+        yield client
+
+
+def keys(s3_client, bucket_name):
+    return sorted(obj['Key'] for obj in s3_client.list_objects_v2(Bucket=bucket_name).get('Contents', []))
+
+
+@pytest.fixture()
+def make_dumper(dump):
+    """Makes a ``BookDumper`` of the ``BUCKETS``, on the fake archive"""
+
+    def make_dumper(**kwargs):
+        options = {
+            'host': HOST,
+            'region': REGION,
+            'bucket_names': BUCKETS,
+            'prefixes': PREFIXES,
+            'filepath': dump.gen_filepath,
+            'resources': dump.ResourceRegistry(),
+        }
+        options.update(kwargs)
+        return dump.BookDumper(**options)
+
+    return make_dumper
@@ -0,0 +1,26 @@
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+PAGES = ['301d5176-9ace-4219-b44b-85dcf781e1e3', 'a934a123-39ea-4099-96bc-1b6c8deb55fe']
+
+
+def export(dump, archive, path, *args):
+    archive.add_book(BOOK, '1.1', PAGES, history=['1.1'])
+    dump.main(['--export', str(path), '--host', 'archive.example.org', '--book', BOOK, *args],
+              standalone_mode=False)
+
+
+def test_bulk_pages(dump, archive, tmp_path):
+    export(dump, archive, tmp_path / 'each')
+    assert f'/contents/{BOOK}@1.1:{PAGES[0]}.html' in archive.requested
+    del archive.requested[:]
+    export(dump, archive, tmp_path / 'bulk', '--bulk')
+
+    # The pages are dumped just as they are without --bulk...
+    for page in PAGES:
+        for format_ in ('json', 'html'):
+            name = f'{BOOK}@1.1:{page}@1.{format_}'
+            assert (tmp_path / 'bulk' / 'baked' / name).read_bytes() == \
+                (tmp_path / 'each' / 'baked' / name).read_bytes()
+    # ...without requesting their baked HTML
+    baked_pages_html = [f'/contents/{BOOK}@1.1:{page}.html' for page in PAGES]
+    assert not set(baked_pages_html) & set(archive.requested)
+    assert f'/contents/{BOOK}@1.1:{PAGES[0]}.json' in archive.requested
@@ -0,0 +1,43 @@
+import os
+import tarfile
+
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+PAGES = ['301d5176-9ace-4219-b44b-85dcf781e1e3', 'a934a123-39ea-4099-96bc-1b6c8deb55fe']
+SHA1 = 'ab' * 20
+
+
+def export(dump, archive, path, *args):
+    archive.add_book(BOOK, '1.2', PAGES, history=['1.2', '1.1'])
+    archive.add_book(BOOK, '1.1', PAGES)
+    # (the latest version)
+    archive.add_book(BOOK, '1.2', PAGES, history=['1.2', '1.1'])
+    dump.main(['--export', path, '--host', 'archive.example.org', '--book', BOOK, '--all-versions', *args],
+              standalone_mode=False)
+
+
+def test_tar(dump, archive, tmp_path):
+    path = str(tmp_path / 'out.tar.gz')
+    export(dump, archive, path)
+
+    with tarfile.open(path) as tar:
+        names = tar.getnames()
+        pointer = tar.extractfile(f'baked/latest/{BOOK}:{PAGES[0]}.html').read()
+        media_type = tar.extractfile(f'resources/{SHA1}-media-type').read()
+
+    # Each pointer is archived once, pointing at the newest version
+    assert sorted(name for name in names if '/latest/' in name) == sorted(
+        [f'raw/latest/{BOOK}.json', f'raw/latest/{BOOK}.html', f'baked/latest/{BOOK}.json', f'baked/latest/{BOOK}.html']
+        + [f'raw/latest/{page}.{format_}' for page in PAGES for format_ in ('json', 'html')]
+        + [f'baked/latest/{BOOK}:{page}.{format_}' for page in PAGES for format_ in ('json', 'html')])
+    assert f'"key": "baked/{BOOK}@1.2:{PAGES[0]}@1.html"'.encode('utf-8') in pointer
+    assert f'baked/done/{BOOK}@1.1' in names and f'baked/done/{BOOK}@1.2' in names
+    assert media_type == b'image/png'
+
+
+def test_directory(dump, archive, tmp_path):
+    export(dump, archive, str(tmp_path), '--precompress', 'gzip')
+
+    assert os.path.exists(tmp_path / 'raw' / f'{BOOK}@1.1.json')
+    assert os.path.exists(tmp_path / 'baked' / f'{BOOK}@1.2:{PAGES[1]}@1.html.gz')
+    assert (tmp_path / 'resources' / SHA1).read_bytes() == b'png'
+    assert (tmp_path / 'resources' / f'{SHA1}-media-type').read_bytes() == b'image/png'
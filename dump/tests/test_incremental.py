@@ -0,0 +1,71 @@
+import pytest
+
+from .conftest import keys
+
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+PAGES = ['301d5176-9ace-4219-b44b-85dcf781e1e3', 'a934a123-39ea-4099-96bc-1b6c8deb55fe']
+
+
+@pytest.fixture()
+def failing_upload(dump, monkeypatch):
+    """Makes the upload of the keys added to the returned set fail"""
+    failing = set()
+    put = dump.S3Target.put
+
+    def failing_put(self, bucket_name, key, *args, **kwargs):
+        if key in failing:
+            raise OSError(f'failed to upload {key}')
+        return put(self, bucket_name, key, *args, **kwargs)
+
+    monkeypatch.setattr(dump.S3Target, 'put', failing_put)
+    return failing
+
+
+def test_done_marker_after_successful_upload(dump, archive, s3, make_dumper, failing_upload):
+    archive.add_book(BOOK, '1.1', PAGES)
+    failing_upload.add(f'{BOOK}@1.1:{PAGES[1]}@1.html')
+
+    with pytest.raises(OSError):
+        make_dumper(incremental=True).dump(BOOK)
+    assert f'done/{BOOK}@1.1' not in keys(s3, 'baked-bucket')
+
+    failing_upload.clear()
+    archive.requested.clear()
+    dumper = make_dumper(incremental=True)
+    dumper.dump(BOOK)
+
+    # The version is dumped again, but only what is missing is requested
+    assert dumper.existing.versions_skipped == 0
+    assert f'/contents/{BOOK}@1.1:{PAGES[1]}.html' in archive.requested
+    assert f'/contents/{BOOK}@1.1:{PAGES[0]}.html' not in archive.requested
+    assert f'done/{BOOK}@1.1' in keys(s3, 'baked-bucket')
+
+    archive.requested.clear()
+    dumper = make_dumper(incremental=True)
+    dumper.dump(BOOK)
+
+    assert dumper.existing.versions_skipped == 1
+    assert archive.requested == [f'/contents/{BOOK}.json']
+
+
+def test_skip_version_needs_siblings(dump, archive, s3, make_dumper):
+    archive.add_book(BOOK, '1.1', PAGES)
+    make_dumper().dump(BOOK)
+
+    dumper = make_dumper(incremental=True, precompress=('gzip',))
+    assert not dumper.existing.skip_version(BOOK, '1.1')
+    dumper.dump(BOOK)
+
+    assert make_dumper(incremental=True, precompress=('gzip',)).existing.skip_version(BOOK, '1.1')
+    assert f'{BOOK}@1.1:{PAGES[0]}@1.json.gz' in keys(s3, 'baked-bucket')
+
+
+def test_skip(dump, s3, make_dumper):
+    s3.put_object(Bucket='raw-bucket', Key=f'{PAGES[0]}@1.json', Body=b'{}')
+    existing = make_dumper(incremental=True).existing
+
+    assert existing.skip('raw-page-json', [(BOOK, '1.1'), (PAGES[0], '1')])
+    assert not existing.skip('raw-page-json', [(BOOK, '1.1'), (PAGES[1], '1')])
+    # (seen by this run)
+    assert existing.skip('raw-page-json', [(BOOK, '1.2'), (PAGES[1], '1')])
+    assert existing.skipped == 2
@@ -0,0 +1,72 @@
+from .conftest import BUCKETS, keys
+
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+PAGES = ['301d5176-9ace-4219-b44b-85dcf781e1e3', 'a934a123-39ea-4099-96bc-1b6c8deb55fe']
+
+
+def test_record(dump, tmp_path):
+    journal = dump.DumpJournal(str(tmp_path / 'dump.sqlite'))
+    journal.record('raw-bucket', 'abc@1.1.json', 2, '"etag"')
+
+    # (as reopened by the next run)
+    journal = dump.DumpJournal(str(tmp_path / 'dump.sqlite'))
+    assert ('raw-bucket', 'abc@1.1.json') in journal
+    assert journal.skip('raw-bucket', 'abc@1.1.json')
+    assert not journal.skip('baked-bucket', 'abc@1.1.json')
+    assert journal.skipped == 1
+    assert list(journal.entries()) == [('raw-bucket', 'abc@1.1.json', 2, '"etag"')]
+
+
+def test_resume_skips_journaled(dump, archive, s3, make_dumper, tmp_path):
+    archive.add_book(BOOK, '1.1', PAGES)
+    path = str(tmp_path / 'dump.sqlite')
+    make_dumper(journal=dump.DumpJournal(path)).dump(BOOK)
+    journal = dump.DumpJournal(path)
+    assert len(journal) == sum(len(keys(s3, bucket_name)) for bucket_name in BUCKETS.values()) - len([
+        # (the pointers and the done marker aren't journaled)
+        key for key in keys(s3, 'raw-bucket') + keys(s3, 'baked-bucket')
+        if key.startswith(('latest/', 'done/'))
+    ])
+
+    archive.requested.clear()
+    stats, summary = make_dumper(journal=journal).dump(BOOK)
+
+    assert sum(stats.objects.values()) == 0
+    # Only the JSON listing the rest of the content is requested again
+    assert sorted(archive.requested) == sorted([
+        f'/contents/{BOOK}.json',
+        f'/contents/{BOOK}@1.1.json?as_collated=0',
+        f'/contents/{BOOK}@1.1.json',
+    ] + [f'/contents/{BOOK}@1.1:{page}.json' for page in PAGES])
+
+
+def test_resume_needs_siblings(dump, archive, s3, make_dumper, tmp_path):
+    archive.add_book(BOOK, '1.1', PAGES)
+    path = str(tmp_path / 'dump.sqlite')
+    make_dumper(journal=dump.DumpJournal(path)).dump(BOOK)
+
+    archive.requested.clear()
+    make_dumper(journal=dump.DumpJournal(path), precompress=('gzip',)).dump(BOOK)
+
+    # The HTML is dumped again, with its sibling, the resource isn't
+    assert f'/contents/{BOOK}@1.1.html' in archive.requested
+    assert f'/resources/{"ab" * 20}' not in archive.requested
+    assert f'{BOOK}@1.1.html.gz' in keys(s3, 'baked-bucket')
+
+
+def test_verify(dump, archive, s3, make_dumper, tmp_path):
+    archive.add_book(BOOK, '1.1', PAGES)
+    journal = dump.DumpJournal(str(tmp_path / 'dump.sqlite'))
+    make_dumper(journal=journal).dump(BOOK)
+    assert list(journal.verify(s3)) == []
+
+    s3.delete_object(Bucket='raw-bucket', Key=f'{BOOK}@1.1.json')
+    s3.put_object(Bucket='baked-bucket', Key=f'{BOOK}@1.1.html', Body=b'<html>truncated')
+
+    problems = sorted(journal.verify(s3))
+    assert [(bucket_name, key) for bucket_name, key, problem in problems] == [
+        ('baked-bucket', f'{BOOK}@1.1.html'),
+        ('raw-bucket', f'{BOOK}@1.1.json'),
+    ]
+    assert problems[0][2].startswith('expected ')
+    assert problems[1][2] == 'missing'
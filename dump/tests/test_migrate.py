@@ -0,0 +1,49 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+from .conftest import HERE
+
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+
+
+@pytest.fixture(scope='session')
+def migrate_layout():
+    spec = importlib.util.spec_from_file_location('migrate_layout', os.path.join(HERE, '..', 'migrate-layout.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def dump_version(s3_client, version):
+    key = f'raw/{BOOK}@{version}.json'
+    s3_client.put_object(Bucket='raw-bucket', Key=key, Body=b'{}', ContentType='application/json')
+    s3_client.put_object(Bucket='raw-bucket', Key=f'raw/latest/{BOOK}.json',
+                         Body=json.dumps({'id': BOOK, 'version': version, 'key': key}).encode('utf-8'))
+
+
+def migrate(migrate_layout, s3_client):
+    migration = migrate_layout.Migration(s3_client, 'raw-bucket', 'baked-bucket')
+    migration.load()
+    list(migrate_layout.dump.run_tasks([migration.list_task('')]))
+    return migration.counts
+
+
+def pointer(s3_client):
+    return json.load(s3_client.get_object(Bucket='baked-bucket', Key=f'raw/latest/{BOOK}.json')['Body'])
+
+
+def test_migrate_again(migrate_layout, s3):
+    dump_version(s3, '1.1')
+    assert migrate(migrate_layout, s3) == {'copied': 1, 'rewritten': 1, 'skipped': 0, 'failed': 0}
+    assert pointer(s3)['key'] == f'raw/{BOOK}@9997.9997.9999.json'
+
+    # Nothing moved
+    assert migrate(migrate_layout, s3) == {'copied': 0, 'rewritten': 0, 'skipped': 2, 'failed': 0}
+
+    # A new version was dumped into the source bucket since
+    dump_version(s3, '1.2')
+    assert migrate(migrate_layout, s3) == {'copied': 1, 'rewritten': 1, 'skipped': 1, 'failed': 0}
+    assert pointer(s3) == {'id': BOOK, 'version': '1.2', 'key': f'raw/{BOOK}@9997.9996.9999.json'}
@@ -0,0 +1,94 @@
+import collections
+import io
+import json
+
+import pytest
+
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+PAGES = ['301d5176-9ace-4219-b44b-85dcf781e1e3', 'a934a123-39ea-4099-96bc-1b6c8deb55fe']
+
+
+class CountingTarget:
+    """A ``DirectoryTarget`` counting the reads and writes of the pointers"""
+
+    def __init__(self, target):
+        self.target = target
+        self.sidecars = target.sidecars
+        self.calls = collections.Counter()
+
+    def put(self, *args, **kwargs):
+        self.target.put(*args, **kwargs)
+
+    def read(self, bucket_name, key):
+        self.calls['read', key] += 1
+        return self.target.read(bucket_name, key)
+
+    def write(self, bucket_name, key, body, extra_args):
+        self.calls['write', key] += 1
+        self.target.write(bucket_name, key, body, extra_args)
+
+
+@pytest.fixture()
+def target(dump, tmp_path):
+    return CountingTarget(dump.DirectoryTarget(str(tmp_path)))
+
+
+def version_items(dump, version):
+    yield io.BytesIO(b'{}'), 'application/json', 'baked-book-json', [(BOOK, version)]
+    for page in PAGES:
+        yield io.BytesIO(b'<html/>'), 'text/html', 'baked-page-html', [(BOOK, version), (page, None)]
+    yield dump.version_done(BOOK, version)
+
+
+def pointer(target, key):
+    return json.loads(target.target.read('bucket', key))
+
+
+def test_update(dump, target):
+    pointers = dump.LatestPointers(dump.gen_filepath)
+    pointers.update('bucket', 'baked-book-json', [(BOOK, '1.9')], f'{BOOK}@1.9.json')
+    pointers.update('bucket', 'baked-book-json', [(BOOK, '1.10')], f'{BOOK}@1.10.json')
+    pointers.update('bucket', 'baked-book-json', [(BOOK, '1.2')], f'{BOOK}@1.2.json')
+    assert target.calls == {}
+
+    pointers.flush(target)
+    assert pointer(target, f'latest/{BOOK}.json') == {'id': BOOK, 'version': '1.10', 'key': f'{BOOK}@1.10.json'}
+    assert target.calls == {('read', f'latest/{BOOK}.json'): 1, ('write', f'latest/{BOOK}.json'): 1}
+
+
+def test_not_moved_back(dump, target):
+    target.target.write('bucket', f'latest/{BOOK}.json',
+                        json.dumps({'id': BOOK, 'version': '2', 'key': f'{BOOK}@2.json'}).encode('utf-8'), {})
+    pointers = dump.LatestPointers(dump.gen_filepath)
+    pointers.update('bucket', 'baked-book-json', [(BOOK, '1.10')], f'{BOOK}@1.10.json')
+    pointers.flush(target)
+
+    assert pointer(target, f'latest/{BOOK}.json')['version'] == '2'
+    assert target.calls == {('read', f'latest/{BOOK}.json'): 1}
+
+
+def test_written_once_per_version(dump, target):
+    pointers = dump.LatestPointers(dump.gen_filepath)
+    for version in ('1.10', '1.9'):
+        dump.dump_in_bucket(version_items(dump, version), 'bucket', 'bucket', 'bucket', 'us-east-1',
+                            dump.gen_filepath, target=target, pointers=pointers)
+
+    # Once each, by the newest version, the older version reads none
+    pointer_keys = [f'latest/{BOOK}.json'] + [f'latest/{BOOK}:{page}.html' for page in PAGES]
+    assert target.calls == {
+        **{('read', key): 1 for key in pointer_keys},
+        **{('write', key): 1 for key in pointer_keys},
+        ('write', f'done/{BOOK}@1.10'): 1,
+        ('write', f'done/{BOOK}@1.9'): 1,
+    }
+    assert pointer(target, f'latest/{BOOK}:{PAGES[0]}.html')['key'] == f'{BOOK}@1.10:{PAGES[0]}.html'
+
+
+def test_written_before_done_marker(dump, target, monkeypatch):
+    order = []
+    monkeypatch.setattr(target, 'write', lambda bucket_name, key, *args: order.append(key))
+    dump.dump_in_bucket(version_items(dump, '1.1'), 'bucket', 'bucket', 'bucket', 'us-east-1',
+                        dump.gen_filepath, target=target)
+
+    assert order[-1] == f'done/{BOOK}@1.1'
+    assert len(order) == len(PAGES) + 2
@@ -0,0 +1,47 @@
+import pytest
+import requests
+
+from .conftest import keys
+
+BOOK = '02776133-d49d-49cb-bfaa-67c7f61b25a1'
+PAGES = ['301d5176-9ace-4219-b44b-85dcf781e1e3', 'a934a123-39ea-4099-96bc-1b6c8deb55fe']
+
+
+@pytest.fixture()
+def history(archive):
+    """A book whose version 1.2, in its history, archive can't serve"""
+    archive.add_book(BOOK, '1.1', PAGES)
+    archive.add_book(BOOK, '1.3', PAGES, history=['1.3', '1.2', '1.1'])
+    return archive
+
+
+def test_all_versions_skips_missing_version(history, s3, make_dumper):
+    stats, summary = make_dumper(all_versions=True).dump(BOOK)
+
+    assert [key for key in keys(s3, 'baked-bucket') if key.startswith('done/')] == [
+        f'done/{BOOK}@1.1', f'done/{BOOK}@1.3',
+    ]
+    assert f'{BOOK}@1.1.html' in keys(s3, 'baked-bucket')
+    assert "1 versions archive couldn't serve" in summary[-2]
+    assert summary[-1].endswith(f'{BOOK}@1.2')
+
+
+def test_all_versions_skips_version_not_json(history, s3, make_dumper):
+    # e.g. a legacy version, which was never baked
+    history.add_book(BOOK, '1.2', PAGES)
+    history.add(f'/contents/{BOOK}@1.2.json', b'<html>Not baked</html>', 'text/html')
+    history.add_book(BOOK, '1.3', PAGES, history=['1.3', '1.2', '1.1'])
+    stats, summary = make_dumper(all_versions=True).dump(BOOK)
+
+    assert f'done/{BOOK}@1.2' not in keys(s3, 'baked-bucket')
+    assert f'{BOOK}@1.2.json' not in keys(s3, 'raw-bucket')
+    assert summary[-1].endswith(f'{BOOK}@1.2')
+
+
+def test_missing_latest_version_fails(dump, archive, s3, make_dumper):
+    with pytest.raises(requests.HTTPError):
+        make_dumper().dump(BOOK)
+
+    archive.add(f'/contents/{BOOK}.json', {'id': BOOK, 'version': '1.1', 'history': []})
+    with pytest.raises(dump.VersionUnavailable):
+        make_dumper().dump(BOOK)
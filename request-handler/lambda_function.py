@@ -1,22 +1,164 @@
 # Added by mike; written by karen
 # View latest lambda function here: https://console.aws.amazon.com/lambda/home?region=us-east-1#/functions/ce-rap-karen-request-handler/versions/$LATEST?tab=graph
 
-import re
+import http.client
 import xml.etree.ElementTree as ET
-from urllib.request import urlopen
+from urllib.parse import urlencode, urlsplit
 
+from edge_config import setting
+from listing_cache import MISSING, ListingCache
+from version_index import VersionIndex
 
-def get_listing(prefix, suffix, bucket='ce-baked-rap-distribution-373045849756'):
-    url = f'https://{bucket}.s3.amazonaws.com/?list-type=2&prefix={prefix}'
-    ns = 'http://s3.amazonaws.com/doc/2006-03-01/'
-    root = ET.fromstring(urlopen(url).read())
-    listing = [a.text for a in root.findall(f'./{{{ns}}}Contents/{{{ns}}}Key')
-               if a.text.endswith(suffix)]
-    # sort by version
-    listing.sort(reverse=True,
-                 key=lambda a: float(
-                     re.search('[0-9a-f]+@([0-9]+(.[0-9]+)?)', a).group(1)))
-    return listing
+# The settings are deployed with the code (see edge_config.py),
+# as Lambda@Edge functions have no environment variables.
+
+# Cache-Control of the redirects: the /contents/ rewrites never change,
+# a latest-version redirect only until the next version is published.
+CONTENTS_REDIRECT_CACHE_CONTROL = setting(
+    'CONTENTS_REDIRECT_CACHE_CONTROL', 'public, max-age=31536000')
+LATEST_REDIRECT_CACHE_CONTROL = setting(
+    'LATEST_REDIRECT_CACHE_CONTROL', 'public, max-age=60')
+NOT_FOUND_CACHE_CONTROL = setting(
+    'NOT_FOUND_CACHE_CONTROL', 'public, max-age=10')
+
+BUCKET_NAME = 'ce-baked-rap-distribution-373045849756'
+S3_NS = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+
+# Connections to S3 by host, kept open between the invocations
+# of a warm container to save a TCP/TLS handshake per listing
+S3_CONNECTIONS = {}
+# e.g. a local S3 to run against (see benchmarks/), which is sent
+# the requests of every bucket, with the bucket's host as the Host
+S3_ENDPOINT_URL = setting('S3_ENDPOINT_URL')
+
+# The newest versions of a book in which a page is looked for, one by
+# one, before all the book's pages are listed at once, so that a page
+# that isn't in the book costs a bounded number of listings
+PAGE_PROBES = 3
+
+# Resolved latest versions, kept for the life of a warm container
+LISTING_CACHE = ListingCache(
+    maxsize=int(setting('LISTING_CACHE_MAXSIZE', 1024)),
+    ttl=float(setting('LISTING_CACHE_TTL', 60)),
+    negative_ttl=float(setting('LISTING_CACHE_NEGATIVE_TTL', 10)),
+)
+
+
+def s3_connection(host):
+    if S3_ENDPOINT_URL is None:
+        return http.client.HTTPSConnection(host, timeout=5)
+    endpoint = urlsplit(S3_ENDPOINT_URL)
+    if endpoint.scheme == 'http':
+        return http.client.HTTPConnection(endpoint.netloc, timeout=5)
+    return http.client.HTTPSConnection(endpoint.netloc, timeout=5)
+
+
+def s3_get(bucket, path):
+    """GET ``path`` from the ``bucket`` over its kept-alive connection"""
+    host = f'{bucket}.s3.amazonaws.com'
+    for retry in (True, False):
+        conn = S3_CONNECTIONS.get(host)
+        if conn is None:
+            conn = S3_CONNECTIONS[host] = s3_connection(host)
+        try:
+            conn.request('GET', path, headers={'Host': host})
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # S3 closes idle connections, so ours may have gone stale
+            # while the container was frozen; reconnect once.
+            conn.close()
+            del S3_CONNECTIONS[host]
+            if not retry:
+                raise
+            continue
+        if response.status != 200:
+            body = response.read()
+            raise http.client.HTTPException(f'{response.status} {response.reason}: {body[:200]!r}')
+        return response
+
+
+def list_objects(prefix, bucket=BUCKET_NAME, delimiter=None, max_keys=None):
+    """Yield the keys (as ``('Key', key)``) and common prefixes (as
+    ``('Prefix', prefix)``) listed at ``prefix``, following the
+    continuation tokens one page at a time, so the caller can stop early.
+
+    Each page is parsed as it is read, rather than all at once.
+    """
+    params = {'list-type': 2, 'prefix': prefix}
+    if delimiter is not None:
+        params['delimiter'] = delimiter
+    if max_keys is not None:
+        params['max-keys'] = max_keys
+
+    while True:
+        response = s3_get(bucket, f'/?{urlencode(params)}')
+        token = None
+        try:
+            for event, elem in ET.iterparse(response):
+                if elem.tag == f'{S3_NS}Contents':
+                    yield 'Key', elem.findtext(f'{S3_NS}Key')
+                    elem.clear()
+                elif elem.tag == f'{S3_NS}CommonPrefixes':
+                    yield 'Prefix', elem.findtext(f'{S3_NS}Prefix')
+                    elem.clear()
+                elif elem.tag == f'{S3_NS}NextContinuationToken':
+                    token = elem.text
+        finally:
+            # The rest of the response has to be read
+            # before the connection can be used again.
+            response.read()
+        if token is None:
+            return
+        params['continuation-token'] = token
+
+
+def get_listing(prefix, suffix, bucket=BUCKET_NAME):
+    # Delimiting on ":" collapses a book version's pages into one prefix
+    return VersionIndex(value for name, value in list_objects(prefix, bucket, delimiter=':')
+                        if name == 'Key' and value.endswith(suffix))
+
+
+def get_version_prefixes(book, bucket=BUCKET_NAME):
+    """Index the ``{book}@{version}:`` prefixes of the book's pages"""
+    return VersionIndex(value for name, value in list_objects(f'{book}@', bucket, delimiter=':')
+                        if name == 'Prefix')
+
+
+def get_page_listing(book, page, suffix, bucket=BUCKET_NAME):
+    """Index the keys of ``page`` in every version of the ``book``,
+    listing all the book's pages at once
+    """
+    infix = f":{page.split('@', 1)[0]}"
+    return VersionIndex(value for name, value in list_objects(f'{book}@', bucket)
+                        if infix in value and value.endswith(suffix))
+
+
+def find_page(prefix, suffix, bucket=BUCKET_NAME):
+    """Find the key of the page at ``prefix`` (``{book}@{version}:{page}``)"""
+    for name, value in list_objects(prefix, bucket, max_keys=10):
+        if value.endswith(suffix):
+            return value
+    return None
+
+
+def resolve_latest(path, suffix):
+    """Find the key of the latest version of ``path``,
+    or ``None`` when there is no such content
+    """
+    page = None
+    if path.startswith('baked/') and ':' in path:
+        book, page = path.split(':', 1)
+        if '@' not in book:
+            # Only the versions are listed,
+            # then we look for the page from the newest version down.
+            for i, version_prefix in enumerate(get_version_prefixes(book).newest()):
+                if i == PAGE_PROBES:
+                    return get_page_listing(book, page, suffix).latest(page)
+                key = find_page(f'{version_prefix}{page}', suffix)
+                if key is not None:
+                    return key
+            return None
+    return get_listing(path, suffix).latest(page)
 
 
 def lambda_handler(event, context):
@@ -34,7 +176,8 @@ def lambda_handler(event, context):
                 'location': [{
                     'key': 'Location',
                     'value': uri.replace('/contents/', ':' in uri and '/baked/' or '/raw/'),
-                }]
+                }],
+                'cache-control': [{'key': 'Cache-Control', 'value': CONTENTS_REDIRECT_CACHE_CONTROL}],
             }
         }
 
@@ -51,18 +194,21 @@ def lambda_handler(event, context):
             return {
                 'status': '404',
                 'statusDescription': 'Not Found',
+                'headers': {
+                    'cache-control': [{'key': 'Cache-Control', 'value': NOT_FOUND_CACHE_CONTROL}],
+                },
             }
-        listing = None
-        if baked and ':' in uri:
-            book, page = path.split(':', 1)
-            if '@' not in book:
-                listing = [a for a in get_listing(book, f'.{format_}') if page in a]
-        if listing is None:
-            listing = get_listing(path, f'.{format_}')
-        if not listing:
+        key = LISTING_CACHE.get((path, format_))
+        if key is MISSING:
+            key = resolve_latest(path, f'.{format_}')
+            LISTING_CACHE.set((path, format_), key)
+        if key is None:
             return {
                 'status': '404',
                 'statusDescription': 'Not Found',
+                'headers': {
+                    'cache-control': [{'key': 'Cache-Control', 'value': NOT_FOUND_CACHE_CONTROL}],
+                },
             }
         return {
             'status': '301',
@@ -70,8 +216,9 @@ def lambda_handler(event, context):
             'headers': {
                 'location': [{
                     'key': 'Location',
-                    'value': f'/{listing[0]}',
+                    'value': f'/{key}',
                 }],
+                'cache-control': [{'key': 'Cache-Control', 'value': LATEST_REDIRECT_CACHE_CONTROL}],
             }
         }
 
@@ -0,0 +1,146 @@
+"""An index of the versions found in a listing of content keys.
+
+Keys follow the layout written by the dumper's ``gen_filepath``
+(``{uuid}@{version}.{format}`` and ``{uuid}@{version}:{uuid}@{version}.{format}``,
+optionally behind a ``raw/`` or ``baked/`` prefix). Each key is parsed once
+into integer tuples, so ``1.10`` correctly sorts above ``1.9``, and the
+versions are kept sorted as they are added.
+
+Note, this module is shared by ``sam-app/src`` and ``request-handler``;
+both copies must be kept identical.
+
+"""
+import bisect
+import re
+
+KEY_RE = re.compile(
+    r"(?:^|/)(?P<id>[0-9a-f-]+)@(?P<version>[0-9]+(?:\.[0-9]+)*)"
+    r"(?::(?P<page>[0-9a-f-]+)(?:@(?P<page_version>[0-9]+(?:\.[0-9]+)*))?)?"
+)
+
+# In the "inverted" key layout (see the dumper's --layout option) each
+# part of a version is inverted and zero-padded to a fixed width, absent
+# parts coming after all others, so that S3 lists the newest version
+# first: ``1.10`` is stored as ``9997.9988.9999``.
+INVERTED_VERSION_PARTS = 3
+INVERTED_VERSION_MAX = 9998
+VERSION_IN_KEY_RE = re.compile(r"@([0-9]+(?:\.[0-9]+)*)(?=[.:]|$)")
+INVERTED_VERSION_IN_KEY_RE = re.compile(r"@([0-9]{4}(?:\.[0-9]{4}){%d})(?=[.:]|$)"
+                                        % (INVERTED_VERSION_PARTS - 1))
+
+
+def parse_version(version):
+    """Parse a version string (e.g. ``'8.14'``) into a tuple of integers"""
+    return tuple(int(part) for part in version.split("."))
+
+
+def parse_key(key):
+    """Parse a content key into a tuple of the uuid, the version tuple,
+    the page uuid and the page version tuple, or ``None`` if the key
+    doesn't contain an ident-hash.
+
+    The page parts are ``None`` for keys that are not pages of a book.
+    """
+    match = KEY_RE.search(key)
+    if match is None:
+        return None
+    page_version = match.group("page_version")
+    return (
+        match.group("id"),
+        parse_version(match.group("version")),
+        match.group("page"),
+        page_version and parse_version(page_version),
+    )
+
+
+class VersionIndex:
+    """Keys indexed by version, answering "latest" style questions
+    without re-sorting the listing
+
+    Parameters
+    ----------
+    keys: iterable of str
+        Keys (or common prefixes) to add, see ``add``
+    """
+
+    def __init__(self, keys=()):
+        # ascending, without duplicates
+        self._versions = []
+        # (version, page) -> (page_version, key)
+        self._keys = {}
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        """Add ``key`` to the index, returning ``False`` when the key
+        has no version (e.g. the dumper's ``latest/`` pointers).
+        """
+        parsed = parse_key(key)
+        if parsed is None:
+            return False
+        id, version, page, page_version = parsed
+        i = bisect.bisect_left(self._versions, version)
+        if i == len(self._versions) or self._versions[i] != version:
+            self._versions.insert(i, version)
+        self._keys[(version, page)] = (page_version, key)
+        return True
+
+    def exists(self, version):
+        """Is there any key for ``version`` (a string or a version tuple)"""
+        if isinstance(version, str):
+            version = parse_version(version)
+        i = bisect.bisect_left(self._versions, version)
+        return i < len(self._versions) and self._versions[i] == version
+
+    def newest(self, page=None):
+        """Yield the keys for ``page`` from the newest version down.
+
+        ``page`` is a page uuid, optionally with its version
+        (``{uuid}@{version}``); without a page the book (or raw content)
+        level keys are yielded.
+        """
+        page_version = None
+        if page is not None and "@" in page:
+            page, page_version = page.split("@", 1)
+            page_version = parse_version(page_version)
+        for version in reversed(self._versions):
+            try:
+                found_page_version, key = self._keys[(version, page)]
+            except KeyError:
+                continue
+            if page_version is None or page_version == found_page_version:
+                yield key
+
+    def latest(self, page=None):
+        """Key of the newest version (containing ``page`` if given),
+        or ``None`` when there is no such key
+        """
+        return next(self.newest(page), None)
+
+
+def invert_version(version):
+    """Encode a version (e.g. ``'1.10'``) for the inverted layout"""
+    parts = parse_version(version)
+    if len(parts) > INVERTED_VERSION_PARTS or max(parts) > INVERTED_VERSION_MAX:
+        raise ValueError(f"version {version} can't be inverted")
+    padding = (INVERTED_VERSION_MAX + 1,) * (INVERTED_VERSION_PARTS - len(parts))
+    return ".".join(f"{part:04d}" for part in tuple(INVERTED_VERSION_MAX - part for part in parts) + padding)
+
+
+def uninvert_version(inverted):
+    """Decode a version of the inverted layout"""
+    return ".".join(str(INVERTED_VERSION_MAX - int(part)) for part in inverted.split(".")
+                    if int(part) <= INVERTED_VERSION_MAX)
+
+
+def invert_key(key):
+    """The key (or URI) of the inverted layout for a key with ident-hashes"""
+    return VERSION_IN_KEY_RE.sub(lambda match: f"@{invert_version(match.group(1))}", key)
+
+
+def uninvert_key(key):
+    """The key (or URI) with ident-hashes for a key of the inverted layout"""
+    return INVERTED_VERSION_IN_KEY_RE.sub(lambda match: f"@{uninvert_version(match.group(1))}", key)
@@ -0,0 +1,44 @@
+"""The settings of the edge handlers.
+
+Lambda@Edge functions can't have environment variables, so the settings
+are deployed along with the code, in an ``edge-config.json`` file next to
+this module: a JSON object of setting names to values, e.g.
+``{"LATEST_VERSION_MODE": "rewrite", "PRECOMPRESSED_ENCODINGS": "br,gzip"}``.
+The environment still takes precedence, for running the handlers
+elsewhere (e.g. in the benchmarks, against a local S3).
+
+Note, this module is shared by ``sam-app/src`` and ``request-handler``;
+both copies must be kept identical.
+
+"""
+import json
+import os
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "edge-config.json")
+
+
+def load_config(path=CONFIG_PATH):
+    """The settings in the file at ``path``, none when there is no file"""
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if not isinstance(config, dict):
+        raise ValueError(f"{path} should hold a JSON object of settings")
+    return config
+
+
+CONFIG = load_config()
+
+
+def setting(name, default=None):
+    """The value (a string, as in the environment) of the ``name`` setting,
+    from the environment, else the config file, else the ``default``
+    """
+    value = os.environ.get(name)
+    if value is None:
+        value = CONFIG.get(name)
+    if value is None:
+        return default
+    return str(value)
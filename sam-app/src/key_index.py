@@ -0,0 +1,297 @@
+"""A prebuilt index of the content keys of a bucket, memory-mapped by the
+handler, so that the latest versions are resolved without listing S3.
+
+The index is a single binary file, built by scanning the bucket once::
+
+    python key_index.py BUCKET -o key-index.bin
+
+It holds a Bloom filter of the known uuids (so unknown ones are left to
+the handler's listing without a lookup), followed by one fixed-size record per version of
+a piece of content (or of a page of a book), sorted by uuid and page uuid
+and from the newest version down. Keys are those written by the dumper's
+``gen_filepath`` behind ``raw/`` and ``baked/`` prefixes, and are rebuilt
+from the records. Anything else in the bucket (e.g. the ``latest/``
+pointers, precompressed siblings or resources) is not indexed.
+
+The keys of a bucket in the inverted layout (see the dumper's ``--layout``
+option) are indexed with their ident-hashes, like those of any other::
+
+    python key_index.py BUCKET -o key-index.bin --layout inverted
+
+The index is a snapshot: content published since it was built is
+unknown to it, or resolves to a version that is no longer the latest.
+It records when it was built, so that the handler stops using it once it
+is too old (see its ``KEY_INDEX_MAX_AGE`` setting); rebuild (and
+redeploy) it when new content is published.
+
+"""
+import bisect
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import time
+import uuid
+
+from version_index import parse_key, parse_version, uninvert_key
+
+MAGIC = b"RAPKEYS2"
+# magic, time it was built (seconds since the epoch), number of records,
+# Bloom filter size in bytes and number of hashes, and the size of the
+# JSON encoded version and format tables
+HEADER = struct.Struct(">8sdIIII")
+# temperature, uuid, page uuid (zeros when not a page), version,
+# page version (NO_VERSION when the key has none) and formats (bitmask)
+RECORD = struct.Struct(">B16s16sHHB")
+# bytes of the record that are searched on: temperature, uuid and page
+SEARCH_SIZE = 33
+
+TEMPERATURES = ("raw", "baked")
+NO_PAGE = bytes(16)
+NO_VERSION = 0xFFFF
+BLOOM_FALSE_POSITIVES = 0.01
+
+
+def bloom_positions(item, bits, hashes):
+    """The bit positions of ``item`` (bytes) in a Bloom filter of ``bits``"""
+    digest = hashlib.blake2b(item, digest_size=16).digest()
+    h1, h2 = struct.unpack(">QQ", digest)
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def build(keys, built_at=None):
+    """Build the index (bytes) of the content ``keys``, as of ``built_at``
+    (seconds since the epoch, by default now)
+    """
+    if built_at is None:
+        built_at = time.time()
+    versions, formats = [], []
+    version_ids, format_ids = {}, {}
+
+    def intern(table, ids, value):
+        if value not in ids:
+            ids[value] = len(table)
+            table.append(value)
+        return ids[value]
+
+    # (temperature, uuid, page uuid, version, page version) -> formats
+    found = {}
+    for key in keys:
+        temperature, _, name = key.partition("/")
+        if temperature not in TEMPERATURES:
+            continue
+        parsed = parse_key(name)
+        if parsed is None or "." not in name:
+            continue
+        id, version, page, page_version = parsed
+        version = ".".join(str(part) for part in version)
+        page_version = page_version and ".".join(str(part) for part in page_version)
+        format_ = name.rsplit(".", 1)[1]
+        if key != rebuild_key(temperature, id, version, page, page_version, format_):
+            # not in the dumper's layout, e.g. "{key}.gz"
+            continue
+        try:
+            record = (TEMPERATURES.index(temperature), uuid.UUID(id).bytes,
+                      uuid.UUID(page).bytes if page else NO_PAGE)
+        except ValueError:
+            continue
+        if str(uuid.UUID(bytes=record[1])) != id or page and str(uuid.UUID(bytes=record[2])) != page:
+            # the keys are rebuilt with the uuids in their canonical form
+            continue
+        if page and record[2] == NO_PAGE:
+            continue
+        record += (version, page_version)
+        found.setdefault(record, set()).add(format_)
+
+    records = []
+    for (temperature, id, page, version, page_version), record_formats in found.items():
+        mask = 0
+        for format_ in record_formats:
+            mask |= 1 << intern(formats, format_ids, format_)
+        if len(formats) > 8:
+            raise ValueError("at most 8 formats can be indexed")
+        records.append((
+            temperature, id, page, parse_version(version),
+            intern(versions, version_ids, version),
+            NO_VERSION if page_version is None else intern(versions, version_ids, page_version),
+            mask,
+        ))
+    if len(versions) >= NO_VERSION:
+        raise ValueError("too many distinct versions to index")
+    # newest version first within each uuid and page
+    records.sort(key=lambda r: r[3], reverse=True)
+    records.sort(key=lambda r: r[:3])
+
+    ids = {(temperature, id) for temperature, id, *rest in records}
+    bits = max(8, math.ceil(-len(ids) * math.log(BLOOM_FALSE_POSITIVES) / math.log(2) ** 2))
+    bits += -bits % 8
+    hashes = max(1, round(bits / max(len(ids), 1) * math.log(2)))
+    bloom = bytearray(bits // 8)
+    for temperature, id in ids:
+        for position in bloom_positions(bytes([temperature]) + id, bits, hashes):
+            bloom[position // 8] |= 1 << (position % 8)
+
+    tables = json.dumps({"versions": versions, "formats": formats}).encode("utf-8")
+    return b"".join([
+        HEADER.pack(MAGIC, built_at, len(records), len(bloom), hashes, len(tables)),
+        tables,
+        bytes(bloom),
+        b"".join(RECORD.pack(temperature, id, page, version, page_version, mask)
+                 for temperature, id, page, _, version, page_version, mask in records),
+    ])
+
+
+def rebuild_key(temperature, id, version, page, page_version, format_):
+    """The key of the content, as the dumper's ``gen_filepath`` writes it"""
+    key = f"{temperature}/{id}@{version}"
+    if page is not None:
+        key += f":{page}" if page_version is None else f":{page}@{page_version}"
+    return f"{key}.{format_}"
+
+
+class KeyIndex:
+    """A memory-mapped index of content keys, see ``build``
+
+    Parameters
+    ----------
+    buffer: bytes-like
+        The index, e.g. an ``mmap`` of the file (see ``open_index``)
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, self.built_at, self._count, bloom_size, self._hashes, tables_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("not a key index")
+        tables = json.loads(bytes(buffer[HEADER.size:HEADER.size + tables_size]))
+        self._versions = tables["versions"]
+        self._formats = {format_: 1 << i for i, format_ in enumerate(tables["formats"])}
+        self._bloom_offset = HEADER.size + tables_size
+        self._bloom_bits = bloom_size * 8
+        self._records_offset = self._bloom_offset + bloom_size
+
+    def __len__(self):
+        return self._count
+
+    def age(self, now=None):
+        """Seconds since the index was built"""
+        return (time.time() if now is None else now) - self.built_at
+
+    def might_contain(self, temperature, id):
+        """Is the uuid (bytes) possibly indexed (or certainly not)"""
+        item = bytes([TEMPERATURES.index(temperature)]) + id
+        for position in bloom_positions(item, self._bloom_bits, self._hashes):
+            if not self._buffer[self._bloom_offset + position // 8] & (1 << (position % 8)):
+                return False
+        return True
+
+    def _search_key(self, i):
+        offset = self._records_offset + i * RECORD.size
+        return self._buffer[offset:offset + SEARCH_SIZE]
+
+    def _records(self, prefix):
+        """Yield the records starting with ``prefix`` (bytes)"""
+        i = bisect.bisect_left(_SearchKeys(self, len(prefix)), prefix)
+        while i < self._count and bytes(self._search_key(i)[:len(prefix)]) == prefix:
+            yield RECORD.unpack_from(self._buffer, self._records_offset + i * RECORD.size)
+            i += 1
+
+    def resolve(self, path, suffix):
+        """Resolve the latest version of ``path`` (e.g. ``raw/{uuid}`` or
+        ``baked/{uuid}:{uuid}``) with the ``suffix`` (e.g. ``.html``)
+        into a tuple of whether the uuid is indexed at all, and the key
+        of the latest version or ``None`` when it can't be told.
+        """
+        temperature, _, ident = path.partition("/")
+        format_ = suffix.lstrip(".")
+        book, _, page = ident.partition(":")
+        book, _, version = book.partition("@")
+        if temperature not in TEMPERATURES or "@" in page or (page and temperature != "baked"):
+            return True, None
+        try:
+            id = uuid.UUID(book).bytes
+            page_id = uuid.UUID(page).bytes if page else NO_PAGE
+        except ValueError:
+            return True, None
+        if page and page_id == NO_PAGE:
+            return True, None
+        if not self.might_contain(temperature, id):
+            return False, None
+
+        search = bytes([TEMPERATURES.index(temperature)]) + id
+        if next(self._records(search), None) is None:
+            # a Bloom filter false positive
+            return False, None
+        mask = self._formats.get(format_, 0)
+        for record in self._records(search + page_id):
+            _, _, _, version_id, page_version_id, formats = record
+            if not formats & mask or version and self._versions[version_id] != version:
+                continue
+            page_version = None if page_version_id == NO_VERSION else self._versions[page_version_id]
+            return True, rebuild_key(temperature, str(uuid.UUID(bytes=id)), self._versions[version_id],
+                                     page and str(uuid.UUID(bytes=page_id)) or None, page_version, format_)
+        return True, None
+
+
+class _SearchKeys:
+    """The search keys of the records, cut to ``size`` bytes,
+    as a sequence for ``bisect``
+    """
+
+    def __init__(self, index, size):
+        self._index = index
+        self._size = size
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        return bytes(self._index._search_key(i)[:self._size])
+
+
+def open_index(path):
+    """Memory-map the index at ``path``, or ``None`` when there is none"""
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # (mmap raises a ValueError for an empty file)
+        return None
+    return KeyIndex(buffer)
+
+
+def main(argv=None):
+    import argparse
+
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Build the key index of a bucket's content")
+    parser.add_argument("bucket")
+    parser.add_argument("-o", "--output", default="key-index.bin", help="index file to write")
+    parser.add_argument("--endpoint-url", help="S3 endpoint, e.g. a local one")
+    parser.add_argument("--layout", choices=("ident-hash", "inverted"), default="ident-hash",
+                        help="layout of the bucket's keys")
+    args = parser.parse_args(argv)
+
+    s3_client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    keys = (
+        obj["Key"]
+        for temperature in TEMPERATURES
+        for page in paginator.paginate(Bucket=args.bucket, Prefix=f"{temperature}/")
+        for obj in page.get("Contents", [])
+    )
+    if args.layout == "inverted":
+        keys = (uninvert_key(key) for key in keys)
+    index = build(keys)
+    tmp_path = f"{args.output}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(index)
+    os.replace(tmp_path, args.output)
+    print(f"{len(KeyIndex(index))} records, {len(index)} bytes written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,344 @@
 import json
-import re
+import os
+import time
 
-import boto3
+from edge_config import setting
+from listing_cache import MISSING, ListingCache
+from metrics import InvocationMetrics
+from version_index import VersionIndex, invert_key, uninvert_key
 
-S3_CLIENT = boto3.client("s3")
+# The settings are deployed with the code (see edge_config.py),
+# as Lambda@Edge functions have no environment variables.
+
+# Created by get_s3_client on first use, so that the requests that never
+# list the bucket (/contents/ rewrites and pinned content) don't pay for
+# importing boto3 and building a client on a cold start
+S3_CLIENT = None
+# e.g. a local S3 to run against (see benchmarks/)
+S3_ENDPOINT_URL = setting("S3_ENDPOINT_URL")
 CONTENTS_BUCKET_NAME = "ce-contents-rap-distribution-373045849756"
 
+# Content-Encodings the dumper precompressed the HTML and JSON with
+# (see its --precompress option), in order of preference, e.g. "br,gzip"
+PRECOMPRESSED_ENCODINGS = [
+    encoding.strip()
+    for encoding in setting("PRECOMPRESSED_ENCODINGS", "").split(",")
+    if encoding.strip()
+]
+PRECOMPRESSED_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+PRECOMPRESSED_FORMATS = (".html", ".json")
+
+# Cache-Control of the redirects we answer with. The /contents/ rewrites
+# never change, while a latest-version redirect changes with every new
+# version, so it is only cached briefly. (Pinned content is served with
+# the Cache-Control the dumper stored it with.)
+CONTENTS_REDIRECT_CACHE_CONTROL = setting(
+    "CONTENTS_REDIRECT_CACHE_CONTROL", "public, max-age=31536000")
+LATEST_REDIRECT_CACHE_CONTROL = setting(
+    "LATEST_REDIRECT_CACHE_CONTROL", "public, max-age=60")
+NOT_FOUND_CACHE_CONTROL = setting(
+    "NOT_FOUND_CACHE_CONTROL", "public, max-age=10")
+
+# How versionless requests get their latest version: with a "redirect"
+# to it, or by a "rewrite" of the request to it, which saves the viewer
+# a round trip (the resolved version is then in the X-Ident-Hash header).
+LATEST_VERSION_MODE = setting("LATEST_VERSION_MODE", "redirect")
+
+# The layout of the bucket's keys (see the dumper's --layout option): the
+# "ident-hash" one, or the "inverted" one, in which S3 lists the newest
+# version of the content first. URLs have ident-hashes in either case.
+KEY_LAYOUT = setting("KEY_LAYOUT", "ident-hash")
+
+# The prebuilt index of the bucket's keys (see key_index.py), when it is
+# deployed along with the function, resolves the latest versions of the
+# content it knows about without listing the bucket, until it is older
+# than KEY_INDEX_MAX_AGE seconds (and misses the newer versions)
+KEY_INDEX_MAX_AGE = float(setting("KEY_INDEX_MAX_AGE", 86400))
+KEY_INDEX_PATH = setting(
+    "KEY_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "key-index.bin"))
+KEY_INDEX = None
+if os.path.exists(KEY_INDEX_PATH):
+    # (only then, its imports are a cold start cost of their own)
+    from key_index import open_index
+    KEY_INDEX = open_index(KEY_INDEX_PATH)
+
+# The newest versions of a book in which a page is looked for, one by
+# one, before all the book's pages are listed at once, so that a page
+# that isn't in the book costs a bounded number of listings
+PAGE_PROBES = 3
+
+# Metrics of every invocation, logged in CloudWatch's Embedded Metric
+# Format (see metrics.py); an empty namespace turns them off
+METRICS = InvocationMetrics(setting("METRICS_NAMESPACE", "RapDistribution"))
+
+# Resolved latest versions, kept for the life of a warm container
+LISTING_CACHE = ListingCache(
+    maxsize=int(setting("LISTING_CACHE_MAXSIZE", 1024)),
+    ttl=float(setting("LISTING_CACHE_TTL", 60)),
+    negative_ttl=float(setting("LISTING_CACHE_NEGATIVE_TTL", 10)),
+)
 
-def get_matching_s3_objects(s3_client, bucket_name, prefix, suffix):
-    paginator = s3_client.get_paginator("list_objects")
 
+def get_s3_client():
+    global S3_CLIENT
+    if S3_CLIENT is None:
+        import boto3
+        S3_CLIENT = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+    return S3_CLIENT
+
+
+def list_objects(s3_client, bucket_name, prefix, delimiter=None, max_keys=None):
+    """Yield the pages of a ListObjectsV2 listing one request at a time,
+    so that callers can stop as soon as they have their answer.
+    """
     kwargs = {"Bucket": bucket_name, "Prefix": prefix}
+    if delimiter is not None:
+        kwargs["Delimiter"] = delimiter
+    if max_keys is not None:
+        kwargs["MaxKeys"] = max_keys
 
-    for page in paginator.paginate(**kwargs):
-        try:
-            contents = page["Contents"]
-        except KeyError:
+    while True:
+        with METRICS.timed("S3Time"):
+            page = s3_client.list_objects_v2(**kwargs)
+        METRICS.add("S3Calls")
+        METRICS.add("ListPages")
+        METRICS.add("KeysScanned", len(page.get("Contents", ())) + len(page.get("CommonPrefixes", ())))
+        yield page
+        if not page.get("IsTruncated"):
             return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
 
-        for obj in contents:
+def get_matching_s3_objects(s3_client, bucket_name, prefix, suffix):
+    # A book's pages are keyed as ``{book}@{version}:{page}...``,
+    # so delimiting on ":" collapses all of a version's pages
+    # into a single common prefix that we never have to page through.
+    for page in list_objects(s3_client, bucket_name, prefix, delimiter=":"):
+        for obj in page.get("Contents", []):
             key = obj["Key"]
             if key.endswith(suffix):
                 yield obj
 
 
+def get_version_prefixes(s3_client, bucket_name, book):
+    """Index the ``{book}@{version}:`` prefixes of the book's pages"""
+    prefixes = [
+        common_prefix["Prefix"]
+        for page in list_objects(s3_client, bucket_name, f"{book}@", delimiter=":")
+        for common_prefix in page.get("CommonPrefixes", [])
+    ]
+    with METRICS.timed("SortTime"):
+        return VersionIndex(prefixes)
+
+
+def get_page_listing(s3_client, bucket_name, book, page, suffix):
+    """Index the keys of ``page`` in every version of the ``book``,
+    listing all the book's pages at once
+    """
+    infix = f":{page.split('@', 1)[0]}"
+    keys = [
+        obj["Key"]
+        for listing in list_objects(s3_client, bucket_name, f"{book}@")
+        for obj in listing.get("Contents", [])
+        if infix in obj["Key"] and obj["Key"].endswith(suffix)
+    ]
+    with METRICS.timed("SortTime"):
+        return VersionIndex(keys)
+
+
+def find_page(s3_client, bucket_name, prefix, suffix):
+    """Find the key of the page at ``prefix`` (``{book}@{version}:{page}``),
+    of which there are only a handful of keys (one per format and encoding).
+    """
+    for page in list_objects(s3_client, bucket_name, prefix, max_keys=10):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(suffix):
+                return obj["Key"]
+    return None
+
+
+def get_latest_pointer(s3_client, bucket_name, path, suffix):
+    """Read the key named by the dumper's "latest version" pointer object
+    for ``path`` (e.g. ``baked/{uuid}:{uuid}``), or ``None`` when there is
+    no pointer.
+    """
+    temperature, ident = path.split("/", 1)
+    pointer_key = f"{temperature}/latest/{ident}{suffix}"
+    METRICS.add("S3Calls")
+    try:
+        with METRICS.timed("S3Time"):
+            obj = s3_client.get_object(Bucket=bucket_name, Key=pointer_key)
+            return json.load(obj["Body"])["key"]
+    except s3_client.exceptions.NoSuchKey:
+        return None
+
+
 def get_listing(s3_client, bucket_name, prefix, suffix):
-    items = [obj["Key"] for obj in get_matching_s3_objects(s3_client, bucket_name, prefix, suffix)]
-    items.sort(reverse=True,
-               key=lambda a: float(
-                   re.search('[0-9a-f]+@([0-9]+(.[0-9]+)?)', a).group(1)))
+    keys = [obj["Key"] for obj in get_matching_s3_objects(s3_client, bucket_name, prefix, suffix)]
+    with METRICS.timed("SortTime"):
+        return VersionIndex(keys)
+
+
+def resolve_latest(s3_client, bucket_name, path, suffix):
+    """Find the key of the latest version of ``path`` (e.g. ``raw/{uuid}``
+    or ``baked/{uuid}:{uuid}``), or ``None`` when there is no such content.
+    """
+    if "@" not in path:
+        # the dumper's pointer object may already have the answer
+        pointer = get_latest_pointer(s3_client, bucket_name, path, suffix)
+        if pointer is not None:
+            METRICS.set("Resolution", "pointer")
+            return pointer
+    METRICS.set("Resolution", "listing")
+
+    if path.startswith("baked/") and ":" in path:
+        book, page = path.split(":", 1)
+        if "@" not in book:
+            # Only the versions are listed,
+            # then we look for the page from the newest version down.
+            for i, version_prefix in enumerate(get_version_prefixes(s3_client, bucket_name, book).newest()):
+                if i == PAGE_PROBES:
+                    return get_page_listing(s3_client, bucket_name, book, page, suffix).latest(page)
+                key = find_page(s3_client, bucket_name, f"{version_prefix}{page}", suffix)
+                if key is not None:
+                    return key
+            return None
+
+    page = path.split(":", 1)[1] if ":" in path else None
+    return get_listing(s3_client, bucket_name, path, suffix).latest(page)
+
+
+def resolve_latest_inverted(s3_client, bucket_name, path, suffix):
+    """Find the key of the latest version of ``path`` like ``resolve_latest``,
+    in a bucket of the inverted layout
+    """
+    if "@" not in path:
+        pointer = get_latest_pointer(s3_client, bucket_name, path, suffix)
+        if pointer is not None:
+            METRICS.set("Resolution", "pointer")
+            return pointer
+    METRICS.set("Resolution", "listing")
+    try:
+        path = invert_key(path)
+    except ValueError:
+        # a version that the layout can't have
+        return None
+
+    # The newest version is listed first, and a version only has a handful
+    # of keys (one per format and encoding, and the prefix of its pages),
+    # so the first page of a short listing usually has the answer.
+    if path.startswith("baked/") and ":" in path:
+        book, page = path.split(":", 1)
+        if "@" not in book:
+            # (the page's versions, or the pinned one)
+            page_prefix = page if "@" in page else f"{page}@"
+            probes = 0
+            for listing in list_objects(s3_client, bucket_name, f"{book}@", delimiter=":", max_keys=10):
+                for common_prefix in listing.get("CommonPrefixes", []):
+                    if probes == PAGE_PROBES:
+                        return find_page_inverted(s3_client, bucket_name, book, page_prefix, suffix)
+                    probes += 1
+                    key = find_page(s3_client, bucket_name, f"{common_prefix['Prefix']}{page_prefix}", suffix)
+                    if key is not None:
+                        return key
+            return None
+
+    for listing in list_objects(s3_client, bucket_name, f"{path}@", delimiter=":", max_keys=10):
+        for obj in listing.get("Contents", []):
+            if obj["Key"].endswith(suffix):
+                return obj["Key"]
+    return None
 
-    return items
+
+def find_page_inverted(s3_client, bucket_name, book, page_prefix, suffix):
+    """Find the key of the page in the newest version of the ``book`` that has
+    it, in a bucket of the inverted layout, listing all the book's pages at once
+    """
+    # (the newest version is listed first)
+    for listing in list_objects(s3_client, bucket_name, f"{book}@"):
+        for obj in listing.get("Contents", []):
+            key = obj["Key"]
+            if key.partition(":")[2].startswith(page_prefix) and key.endswith(suffix):
+                return key
+    return None
+
+
+def resolve_indexed(path, suffix):
+    """Resolve the latest version of ``path`` like ``resolve_latest``,
+    from the ``KEY_INDEX`` if it has the content and isn't too old
+    (content published since it was built is unknown to it)
+    """
+    if KEY_INDEX is not None and KEY_INDEX.age(time.time()) < KEY_INDEX_MAX_AGE:
+        key = KEY_INDEX.resolve(path, suffix)[1]
+        if key is not None:
+            METRICS.set("Resolution", "index")
+            # (the index has the keys with ident-hashes, whatever the layout)
+            return layout_key(key)
+    if KEY_LAYOUT == "inverted":
+        return resolve_latest_inverted(get_s3_client(), CONTENTS_BUCKET_NAME, path, suffix)
+    return resolve_latest(get_s3_client(), CONTENTS_BUCKET_NAME, path, suffix)
+
+
+def layout_key(key):
+    """The key (or URI) in the bucket's ``KEY_LAYOUT`` of a key with ident-hashes"""
+    return invert_key(key) if KEY_LAYOUT == "inverted" else key
+
+
+def ident_hash_key(key):
+    """The key (or URI) with ident-hashes of a key in the bucket's ``KEY_LAYOUT``"""
+    return uninvert_key(key) if KEY_LAYOUT == "inverted" else key
+
+
+def cache_control(value):
+    """The Cache-Control response header (in CloudFront's format)"""
+    return [{"key": "Cache-Control", "value": value}]
+
+
+def not_found():
+    """The response to requests for content that doesn't exist"""
+    return {
+        "status": "404",
+        "statusDescription": "Not Found",
+        "headers": {"cache-control": cache_control(NOT_FOUND_CACHE_CONTROL)},
+    }
+
+
+def ident_hash_header(key):
+    """The X-Ident-Hash header (in CloudFront's format) of the content at
+    ``key``, e.g. ``{uuid}@{version}:{uuid}@{version}``
+    """
+    ident_hash = key.split("/", 1)[1].rsplit(".", 1)[0]
+    return [{"key": "X-Ident-Hash", "value": ident_hash}]
+
+
+def accepted_encodings(headers):
+    """Parse the viewer's Accept-Encoding into a dict of codings to q-values"""
+    accepted = {}
+    for header in headers.get("accept-encoding", []):
+        for coding in header["value"].split(","):
+            coding, _, params = coding.partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def precompressed_uri(uri, headers, encodings):
+    """Rewrite the ``uri`` of HTML or JSON content to its precompressed
+    sibling in the first of the ``encodings`` the viewer accepts.
+    """
+    if not encodings or not uri.endswith(PRECOMPRESSED_FORMATS):
+        return uri
+    accepted = accepted_encodings(headers)
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return f"{uri}{PRECOMPRESSED_EXTENSIONS[encoding]}"
+    return uri
 
 
 def lambda_handler(event, context):
@@ -54,27 +362,51 @@ def lambda_handler(event, context):
 
         Return doc: https://docs.aws.amazon.com/apigateway/latest/developerguide/set-up-lambda-proxy-integrations.html
     """
-    request = event["Records"][0]["cf"]["request"]
+    METRICS.start()
+    response = handle_request(event["Records"][0]["cf"]["request"])
+    METRICS.set("Status", str(response.get("status", "origin")))
+    METRICS.emit()
+    return response
+
+
+def handle_request(request):
+    """Answer the viewer's ``request`` (with a redirect or a not found),
+    or return it, rewritten, for the origin to answer
+    """
     uri = request["uri"]
+    METRICS.set("Uri", uri)
+    METRICS.set("Level", "page" if ":" in uri else "book")
 
     request["uri"] = "/".join(uri.split("/", 3)[0:3])
 
     if uri.startswith("/contents/"):
-        return {
-            "status": 301,
-            "statusDescription": "Found",
-            "headers": {
-                "location": [{
-                    "key": "Location",
-                    "value": uri.replace("/contents/", ":" in uri and "/baked/" or "/raw/"),
-                }]
+        METRICS.set("Shape", "contents")
+        location = uri.replace("/contents/", ":" in uri and "/baked/" or "/raw/")
+        if LATEST_VERSION_MODE != "rewrite":
+            return {
+                "status": 301,
+                "statusDescription": "Found",
+                "headers": {
+                    "location": [{
+                        "key": "Location",
+                        "value": location,
+                    }],
+                    "cache-control": cache_control(CONTENTS_REDIRECT_CACHE_CONTROL),
+                }
             }
-        }
+        uri = location
+        request["uri"] = "/".join(uri.split("/", 3)[0:3])
 
     raw = uri.startswith("/raw/")
     baked = uri.startswith("/baked/")
+    if raw:
+        # (raw content isn't nested in a book)
+        METRICS.set("Shape", "raw")
+        METRICS.set("Level", "content")
+    elif baked:
+        METRICS.set("Shape", "baked")
 
-    # redirect to latest version
+    # redirect (or rewrite) to latest version
     if (raw and uri.count('@') < 1
             or baked and ':' in uri and uri.count('@') < 2
             or baked and ':' not in uri and uri.count('@') < 1):
@@ -82,32 +414,63 @@ def lambda_handler(event, context):
             path, format_ = request["uri"].rsplit(".", 1)
             path = path[1:]
         except ValueError:
-            return {
-                "status": "404",
-                "statusDescription": "Not Found",
-            }
+            return not_found()
 
-        listing = None
-        if baked and ":" in uri:
-            book, page = path.split(":", 1)
-            if "@" not in book:
-                listing = get_listing(S3_CLIENT, CONTENTS_BUCKET_NAME, book, f".{format_}")
-        if listing is None:
-            listing = get_listing(S3_CLIENT, CONTENTS_BUCKET_NAME, path, f".{format_}")
-        if not listing:
+        key = LISTING_CACHE.get((path, format_))
+        if key is MISSING:
+            with METRICS.timed("ResolutionTime"):
+                key = resolve_indexed(path, f".{format_}")
+            LISTING_CACHE.set((path, format_), key)
+            METRICS.set("ListingCache", LISTING_CACHE.stats())
+        else:
+            METRICS.add("CacheHits")
+            METRICS.set("Resolution", "cache")
+        if key is None:
+            return not_found()
+        if LATEST_VERSION_MODE == "rewrite":
+            # Served straight from the origin,
+            # see origin_response_handler for the response.
+            request["uri"] = f"/{key}"
+            request.setdefault("headers", {})["x-ident-hash"] = ident_hash_header(ident_hash_key(key))
+        else:
             return {
-                "status": "404",
-                "statusDescription": "Not Found"
-            }
-        return {
-            "status": "301",
-            "statusDescription": "Found",
-            "headers": {
-                "location": [{
-                    "key": "Location",
-                    "value": f"/{listing[0]}",
-                }]
+                "status": "301",
+                "statusDescription": "Found",
+                "headers": {
+                    "location": [{
+                        "key": "Location",
+                        "value": f"/{ident_hash_key(key)}",
+                    }],
+                    "cache-control": cache_control(LATEST_REDIRECT_CACHE_CONTROL),
+                }
             }
-        }
+    elif raw or baked:
+        try:
+            request["uri"] = layout_key(request["uri"])
+        except ValueError:
+            # a version that the layout can't have
+            return not_found()
 
+    if raw or baked:
+        request["uri"] = precompressed_uri(request["uri"], request.get("headers", {}),
+                                           PRECOMPRESSED_ENCODINGS)
     return request
+
+
+def origin_response_handler(event, context):
+    """Handler for the origin's responses to requests that
+    ``lambda_handler`` rewrote to the latest version
+
+    The resolved version is passed on to the viewer in the X-Ident-Hash
+    header. Since the response is cached under the versionless URL, which
+    will resolve to another version once there is one, it is only cached
+    as long as a latest-version redirect would be.
+
+    """
+    cf = event["Records"][0]["cf"]
+    request, response = cf["request"], cf["response"]
+    ident_hash = request.get("headers", {}).get("x-ident-hash")
+    if ident_hash is not None:
+        response["headers"]["x-ident-hash"] = ident_hash
+        response["headers"]["cache-control"] = cache_control(LATEST_REDIRECT_CACHE_CONTROL)
+    return response
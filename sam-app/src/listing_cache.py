@@ -0,0 +1,95 @@
+"""A bounded, expiring cache of resolved listings.
+
+The cache lives at module scope, so it survives between the invocations
+handled by a warm Lambda container. Lookups that resolved to nothing are
+cached as well (negative caching), usually with a shorter lifetime, so that
+a flood of requests for missing content doesn't become a flood of listings.
+
+Note, this module is shared by ``sam-app/src`` and ``request-handler``;
+both copies must be kept identical.
+
+"""
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class ListingCache:
+    """LRU cache with a time-to-live on every entry
+
+    Parameters
+    ----------
+    maxsize: int
+        Number of entries kept before the least recently used is evicted
+
+    ttl: float
+        Seconds a resolved entry stays valid
+
+    negative_ttl: float
+        Seconds a ``None`` (not found) entry stays valid, defaults to ``ttl``
+
+    clock: callable
+        Source of the current time in seconds
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, negative_ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Look up ``key``, returning ``MISSING`` when it isn't cached
+        (or has expired) and the cached value otherwise, which is ``None``
+        for a negative entry.
+        """
+        try:
+            expires, value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+        if expires <= self.clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        if value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Cache ``value`` for ``key``; a ``None`` value is a negative entry."""
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,86 @@
+"""Per-invocation metrics of the handler, written to the log as a single
+line in CloudWatch's Embedded Metric Format, from which CloudWatch
+extracts the metrics without any API calls from the function.
+
+See https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+
+"""
+import contextlib
+import json
+import sys
+import time
+
+# metric name -> unit
+METRICS = {
+    "S3Calls": "Count",
+    "ListPages": "Count",
+    "KeysScanned": "Count",
+    "CacheHits": "Count",
+    "S3Time": "Milliseconds",
+    "SortTime": "Milliseconds",
+    "ResolutionTime": "Milliseconds",
+    "Duration": "Milliseconds",
+}
+DIMENSIONS = [["Shape", "Level"], ["Status"]]
+
+
+class InvocationMetrics:
+    """The metrics of the invocation in progress
+
+    Parameters
+    ----------
+    namespace: str
+        CloudWatch namespace of the metrics, nothing is emitted without one
+    clock: callable
+        Monotonic clock, in seconds
+    """
+
+    def __init__(self, namespace, clock=time.perf_counter):
+        self.namespace = namespace
+        self._clock = clock
+        self.start()
+
+    def start(self):
+        """Start (over) for a new invocation"""
+        self.values = dict.fromkeys(METRICS, 0)
+        self.properties = {"Shape": "other", "Level": "none", "Status": "none"}
+        self._started = self._clock()
+
+    def add(self, name, value=1):
+        self.values[name] += value
+
+    def set(self, name, value):
+        """Set a dimension or a property (e.g. the URI) of the invocation"""
+        self.properties[name] = value
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """Add the time spent in the block to the ``name`` metric"""
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.values[name] += (self._clock() - started) * 1000
+
+    def record(self):
+        """The invocation's metrics, in Embedded Metric Format"""
+        self.values["Duration"] = (self._clock() - self._started) * 1000
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": DIMENSIONS,
+                    "Metrics": [{"Name": name, "Unit": unit} for name, unit in METRICS.items()],
+                }],
+            },
+        }
+        record.update(self.properties)
+        record.update(self.values)
+        return record
+
+    def emit(self, stream=None):
+        """Write the invocation's metrics to the log (stdout)"""
+        if not self.namespace:
+            return
+        print(json.dumps(self.record(), separators=(",", ":")), file=stream or sys.stdout)
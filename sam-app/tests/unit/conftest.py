@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The Lambda runtime imports the handler modules from the root of ``src/``.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+import edge_config
+
+
+@pytest.fixture()
+def config(mocker):
+    config = {"LATEST_VERSION_MODE": "rewrite", "LISTING_CACHE_TTL": 30}
+    mocker.patch.object(edge_config, "CONFIG", config)
+    return config
+
+
+def test_load_config(tmp_path):
+    path = tmp_path / "edge-config.json"
+    path.write_text(json.dumps({"KEY_LAYOUT": "inverted"}))
+
+    assert edge_config.load_config(str(path)) == {"KEY_LAYOUT": "inverted"}
+
+
+def test_load_config_missing(tmp_path):
+    assert edge_config.load_config(str(tmp_path / "edge-config.json")) == {}
+
+
+def test_load_config_not_an_object(tmp_path):
+    path = tmp_path / "edge-config.json"
+    path.write_text(json.dumps(["KEY_LAYOUT", "inverted"]))
+
+    with pytest.raises(ValueError):
+        edge_config.load_config(str(path))
+
+
+def test_setting(config, monkeypatch):
+    monkeypatch.delenv("LATEST_VERSION_MODE", raising=False)
+    monkeypatch.delenv("LISTING_CACHE_TTL", raising=False)
+    monkeypatch.delenv("KEY_LAYOUT", raising=False)
+
+    assert edge_config.setting("LATEST_VERSION_MODE", "redirect") == "rewrite"
+    # (as a string, like any setting from the environment)
+    assert edge_config.setting("LISTING_CACHE_TTL", 60) == "30"
+    assert edge_config.setting("KEY_LAYOUT", "ident-hash") == "ident-hash"
+    assert edge_config.setting("KEY_LAYOUT") is None
+
+
+def test_setting_environment_first(config, monkeypatch):
+    monkeypatch.setenv("LATEST_VERSION_MODE", "redirect")
+
+    assert edge_config.setting("LATEST_VERSION_MODE") == "redirect"
@@ -1,8 +1,16 @@
+import io
 import json
+import os
+import subprocess
+import sys
+import time
 
 import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
 
-from src import app
+import lambda_function
+from key_index import KeyIndex, build
 
 
 @pytest.fixture()
@@ -47,8 +55,32 @@ def apigw_event():
     }
 
 
+def set_uri(event, uri):
+    event["Records"][0]["cf"]["request"]["uri"] = uri
+    return event
+
+
+@pytest.fixture(autouse=True)
+def clear_listing_cache():
+    lambda_function.LISTING_CACHE.clear()
+
+
+@pytest.fixture()
+def s3_stub():
+    with Stubber(lambda_function.get_s3_client()) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def streaming_body(data):
+    data = json.dumps(data).encode("utf-8")
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
 # FIX ME: Get this test actually testing something useful
 def test_lambda_handler(apigw_event, mocker):
+    # (there is no ``src/app.py`` in the tree; the handler is lambda_function)
+    app = pytest.importorskip("src.app")
     ret = app.lambda_handler(apigw_event, "")
     data = json.loads(ret["body"])
 
@@ -56,3 +88,446 @@ def test_lambda_handler(apigw_event, mocker):
     assert "message" in ret["body"]
     assert data["message"] == "hello world"
     # assert "location" in data.dict_keys()
+
+
+def test_lambda_handler_listing(apigw_event, s3_stub):
+    # the page version is missing
+    key = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html"
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [{"Key": key}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+         "Prefix": "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3",
+         "Delimiter": ":"},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["status"] == "301"
+    assert ret["headers"]["location"][0]["value"] == f"/{key}"
+
+
+def test_lambda_handler_pinned(apigw_event):
+    uri = "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html"
+    set_uri(apigw_event, uri)
+    request = apigw_event["Records"][0]["cf"]["request"]
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret is request
+    assert ret["uri"] == uri
+
+
+def test_lambda_handler_contents_redirect(apigw_event):
+    set_uri(apigw_event, "/contents/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.json")
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["status"] == 301
+    assert ret["headers"]["location"][0]["value"] == "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.json"
+    assert ret["headers"]["cache-control"][0]["value"] == "public, max-age=31536000"
+
+
+def test_lambda_handler_latest_pointer(apigw_event, s3_stub):
+    set_uri(apigw_event, "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.html")
+    key = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html"
+    s3_stub.add_response(
+        "get_object",
+        {"Body": streaming_body({"id": "02776133-d49d-49cb-bfaa-67c7f61b25a1", "version": "8.14", "key": key})},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+         "Key": "baked/latest/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.html"},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["status"] == "301"
+    assert ret["headers"]["location"][0]["value"] == f"/{key}"
+    assert ret["headers"]["cache-control"][0]["value"] == "public, max-age=60"
+
+
+def test_lambda_handler_missing_pointer_falls_back_to_listing(apigw_event, s3_stub):
+    set_uri(apigw_event, "/raw/02776133-d49d-49cb-bfaa-67c7f61b25a1.json")
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [
+            {"Key": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.13.json"},
+            {"Key": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.13.html"},
+            {"Key": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14.json"},
+        ]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+         "Prefix": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1",
+         "Delimiter": ":"},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["status"] == "301"
+    assert ret["headers"]["location"][0]["value"] == "/raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14.json"
+
+
+def test_lambda_handler_latest_page_listing(apigw_event, s3_stub):
+    set_uri(apigw_event, "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.json")
+    book = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    # the book's pages are collapsed into one prefix per version
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [{"Key": f"{book}@8.13.json"}, {"Key": f"{book}@8.14.json"}],
+         "CommonPrefixes": [{"Prefix": f"{book}@8.13:"}, {"Prefix": f"{book}@8.14:"}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@", "Delimiter": ":"},
+    )
+    # the page is not in the newest version...
+    s3_stub.add_response(
+        "list_objects_v2", {},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@8.14:{page}", "MaxKeys": 10},
+    )
+    # ...but it is in the one before
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [{"Key": f"{book}@8.13:{page}@20.html"}, {"Key": f"{book}@8.13:{page}@20.json"}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@8.13:{page}", "MaxKeys": 10},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["status"] == "301"
+    assert ret["headers"]["location"][0]["value"] == f"/{book}@8.13:{page}@20.json"
+
+
+def test_lambda_handler_latest_page_listing_probes(apigw_event, s3_stub):
+    set_uri(apigw_event, "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.json")
+    book = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    versions = [f"8.{minor}" for minor in range(10, 15)]
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"CommonPrefixes": [{"Prefix": f"{book}@{version}:"} for version in versions]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@", "Delimiter": ":"},
+    )
+    # the page is not in the newest versions...
+    for version in versions[:-lambda_function.PAGE_PROBES - 1:-1]:
+        s3_stub.add_response(
+            "list_objects_v2", {},
+            {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@{version}:{page}", "MaxKeys": 10},
+        )
+    # ...so all the book's pages are listed at once
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [
+            {"Key": f"{book}@8.10:{page}@19.json"},
+            {"Key": f"{book}@8.10:00000000-0000-0000-0000-000000000000@1.json"},
+            {"Key": f"{book}@8.11:{page}@20.html"},
+            {"Key": f"{book}@8.11:{page}@20.json"},
+        ]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@"},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["status"] == "301"
+    assert ret["headers"]["location"][0]["value"] == f"/{book}@8.11:{page}@20.json"
+
+
+def test_lambda_handler_caches_not_found(apigw_event, s3_stub):
+    set_uri(apigw_event, "/raw/00000000-0000-0000-0000-000000000000.json")
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response("list_objects_v2", {},
+                         {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+                          "Prefix": "raw/00000000-0000-0000-0000-000000000000",
+                          "Delimiter": ":"})
+
+    for i in range(3):
+        ret = lambda_function.lambda_handler(set_uri(apigw_event, "/raw/00000000-0000-0000-0000-000000000000.json"), "")
+        assert ret["status"] == "404"
+        assert ret["headers"]["cache-control"][0]["value"] == "public, max-age=10"
+    assert lambda_function.LISTING_CACHE.negative_hits >= 2
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", ".br"),
+    ("gzip;q=1.0, br;q=0", ".gz"),
+    ("gzip", ".gz"),
+    ("*", ".br"),
+    ("deflate", ""),
+    (None, ""),
+])
+def test_lambda_handler_precompressed(apigw_event, mocker, accept_encoding, expected):
+    mocker.patch.object(lambda_function, "PRECOMPRESSED_ENCODINGS", ["br", "gzip"])
+    uri = "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html"
+    set_uri(apigw_event, uri)
+    headers = apigw_event["Records"][0]["cf"]["request"]["headers"]
+    if accept_encoding is not None:
+        headers["accept-encoding"] = [{"key": "Accept-Encoding", "value": accept_encoding}]
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["uri"] == f"{uri}{expected}"
+
+
+def test_lambda_handler_precompressed_disabled(apigw_event):
+    uri = "/raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14.json"
+    set_uri(apigw_event, uri)
+    apigw_event["Records"][0]["cf"]["request"]["headers"]["accept-encoding"] = [
+        {"key": "Accept-Encoding", "value": "gzip"}]
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["uri"] == uri
+
+
+def test_lambda_handler_latest_redirect_cache_control(apigw_event, s3_stub, mocker):
+    mocker.patch.object(lambda_function, "LATEST_REDIRECT_CACHE_CONTROL", "public, max-age=5")
+    set_uri(apigw_event, "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.html")
+    key = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html"
+    s3_stub.add_response(
+        "get_object",
+        {"Body": streaming_body({"id": "02776133-d49d-49cb-bfaa-67c7f61b25a1", "version": "8.14", "key": key})},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret["headers"]["cache-control"] == [{"key": "Cache-Control", "value": "public, max-age=5"}]
+
+
+def test_lambda_handler_rewrite_latest(apigw_event, s3_stub, mocker):
+    mocker.patch.object(lambda_function, "LATEST_VERSION_MODE", "rewrite")
+    set_uri(apigw_event, "/contents/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.html")
+    request = apigw_event["Records"][0]["cf"]["request"]
+    key = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html"
+    s3_stub.add_response(
+        "get_object",
+        {"Body": streaming_body({"id": "02776133-d49d-49cb-bfaa-67c7f61b25a1", "version": "8.14", "key": key})},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+         "Key": "baked/latest/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.html"},
+    )
+    ret = lambda_function.lambda_handler(apigw_event, "")
+
+    assert ret is request
+    assert ret["uri"] == f"/{key}"
+    assert ret["headers"]["x-ident-hash"] == [{
+        "key": "X-Ident-Hash",
+        "value": "02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21",
+    }]
+
+
+def test_origin_response_handler(apigw_event):
+    cf = apigw_event["Records"][0]["cf"]
+    cf["request"]["headers"]["x-ident-hash"] = [{"key": "X-Ident-Hash", "value": "02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14"}]
+    cf["response"] = {"status": "200", "headers": {
+        "cache-control": [{"key": "Cache-Control", "value": "public, max-age=31536000, immutable"}]}}
+    ret = lambda_function.origin_response_handler(apigw_event, "")
+
+    assert ret["headers"]["x-ident-hash"][0]["value"] == "02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14"
+    assert ret["headers"]["cache-control"][0]["value"] == "public, max-age=60"
+
+
+def test_origin_response_handler_pinned(apigw_event):
+    cf = apigw_event["Records"][0]["cf"]
+    cf["response"] = {"status": "200", "headers": {
+        "cache-control": [{"key": "Cache-Control", "value": "public, max-age=31536000, immutable"}]}}
+    ret = lambda_function.origin_response_handler(apigw_event, "")
+
+    assert "x-ident-hash" not in ret["headers"]
+    assert ret["headers"]["cache-control"][0]["value"] == "public, max-age=31536000, immutable"
+
+
+def test_import_does_not_load_boto3():
+    code = "import sys, lambda_function; sys.exit('boto3' in sys.modules)"
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(lambda_function.__file__), check=True)
+
+
+@pytest.mark.parametrize("uri", [
+    "/contents/02776133-d49d-49cb-bfaa-67c7f61b25a1:301d5176-9ace-4219-b44b-85dcf781e1e3.json",
+    "/baked/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14:301d5176-9ace-4219-b44b-85dcf781e1e3@21.html",
+])
+def test_lambda_handler_without_listing_makes_no_client(apigw_event, mocker, uri):
+    mocker.patch.object(lambda_function, "S3_CLIENT", None)
+    lambda_function.lambda_handler(set_uri(apigw_event, uri), "")
+
+    assert lambda_function.S3_CLIENT is None
+
+
+def test_lambda_handler_key_index(apigw_event, s3_stub, mocker):
+    book = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    mocker.patch.object(lambda_function, "KEY_INDEX", KeyIndex(build([
+        f"baked/{book}@8.13:{page}@20.html",
+        f"baked/{book}@8.14:{page}@21.html",
+    ])))
+
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/baked/{book}:{page}.html"), "")
+    assert ret["headers"]["location"][0]["value"] == f"/baked/{book}@8.14:{page}@21.html"
+
+
+def test_lambda_handler_key_index_unknown_uuid(apigw_event, s3_stub, mocker):
+    # e.g. a book published since the index was built
+    book = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    mocker.patch.object(lambda_function, "KEY_INDEX", KeyIndex(build([
+        "raw/00000000-0000-0000-0000-000000000000@1.json",
+    ])))
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response("list_objects_v2", {"Contents": [{"Key": f"raw/{book}@1.1.json"}]},
+                         {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+                          "Prefix": f"raw/{book}",
+                          "Delimiter": ":"})
+
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/raw/{book}.json"), "")
+    assert ret["headers"]["location"][0]["value"] == f"/raw/{book}@1.1.json"
+
+
+def test_lambda_handler_key_index_too_old(apigw_event, s3_stub, mocker):
+    book = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    mocker.patch.object(lambda_function, "KEY_INDEX", KeyIndex(build([f"raw/{book}@8.13.json"],
+                                                                     built_at=time.time() - 7200)))
+    mocker.patch.object(lambda_function, "KEY_INDEX_MAX_AGE", 3600)
+    key = f"raw/{book}@8.14.json"
+    s3_stub.add_response(
+        "get_object",
+        {"Body": streaming_body({"id": book, "version": "8.14", "key": key})},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Key": f"raw/latest/{book}.json"},
+    )
+
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/raw/{book}.json"), "")
+    assert ret["headers"]["location"][0]["value"] == f"/{key}"
+
+
+def test_lambda_handler_key_index_falls_back_to_listing(apigw_event, s3_stub, mocker):
+    book = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    mocker.patch.object(lambda_function, "KEY_INDEX", KeyIndex(build([f"raw/{book}@8.14.html"])))
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response("list_objects_v2", {"Contents": [{"Key": f"raw/{book}@8.14.json"}]},
+                         {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+                          "Prefix": f"raw/{book}",
+                          "Delimiter": ":"})
+
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/raw/{book}.json"), "")
+    assert ret["headers"]["location"][0]["value"] == f"/raw/{book}@8.14.json"
+
+
+def test_lambda_handler_inverted_layout_pinned(apigw_event, mocker):
+    mocker.patch.object(lambda_function, "KEY_LAYOUT", "inverted")
+    book = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/baked/{book}@8.14:{page}@21.html"), "")
+
+    assert ret["uri"] == f"/baked/{book}@9990.9984.9999:{page}@9977.9999.9999.html"
+
+    # a version the layout can't have
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/raw/{page}@1.2.3.4.html"), "")
+    assert ret["status"] == "404"
+
+
+def test_lambda_handler_inverted_layout_latest(apigw_event, s3_stub, mocker):
+    mocker.patch.object(lambda_function, "KEY_LAYOUT", "inverted")
+    book = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    # the newest version is listed first
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [{"Key": f"{book}@9990.9984.9999.html"}, {"Key": f"{book}@9990.9984.9999.json"}],
+         "CommonPrefixes": [{"Prefix": f"{book}@9990.9984.9999:"}],
+         "IsTruncated": True, "NextContinuationToken": "next"},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@", "Delimiter": ":", "MaxKeys": 10},
+    )
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/{book}.json"), "")
+
+    assert ret["headers"]["location"][0]["value"] == f"/{book}@8.14.json"
+
+
+def test_lambda_handler_inverted_layout_latest_page(apigw_event, s3_stub, mocker):
+    mocker.patch.object(lambda_function, "KEY_LAYOUT", "inverted")
+    mocker.patch.object(lambda_function, "LATEST_VERSION_MODE", "rewrite")
+    book = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"CommonPrefixes": [{"Prefix": f"{book}@9990.9984.9999:"}, {"Prefix": f"{book}@9990.9985.9999:"}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@", "Delimiter": ":", "MaxKeys": 10},
+    )
+    # the page is not in the newest version...
+    s3_stub.add_response(
+        "list_objects_v2", {},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@9990.9984.9999:{page}@", "MaxKeys": 10},
+    )
+    # ...but it is in the one before
+    key = f"{book}@9990.9985.9999:{page}@9978.9999.9999.html"
+    s3_stub.add_response(
+        "list_objects_v2", {"Contents": [{"Key": key}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@9990.9985.9999:{page}@", "MaxKeys": 10},
+    )
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/{book}:{page}.html"), "")
+
+    assert ret["uri"] == f"/{key}"
+    assert ret["headers"]["x-ident-hash"][0]["value"] == f"{book[6:]}@8.13:{page}@20"
+
+
+def test_lambda_handler_inverted_layout_pinned_page(apigw_event, s3_stub, mocker):
+    mocker.patch.object(lambda_function, "KEY_LAYOUT", "inverted")
+    book = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"CommonPrefixes": [{"Prefix": f"{book}@9990.9984.9999:"}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@", "Delimiter": ":", "MaxKeys": 10},
+    )
+    key = f"{book}@9990.9984.9999:{page}@9977.9999.9999.html"
+    s3_stub.add_response(
+        "list_objects_v2", {"Contents": [{"Key": key}]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME,
+         "Prefix": f"{book}@9990.9984.9999:{page}@9977.9999.9999", "MaxKeys": 10},
+    )
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/{book}:{page}@21.html"), "")
+
+    assert ret["status"] == "301"
+    assert ret["headers"]["location"][0]["value"] == f"/{book}@8.14:{page}@21.html"
+
+
+def test_lambda_handler_inverted_layout_latest_page_probes(apigw_event, s3_stub, mocker):
+    mocker.patch.object(lambda_function, "KEY_LAYOUT", "inverted")
+    book = "baked/02776133-d49d-49cb-bfaa-67c7f61b25a1"
+    page = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+    versions = [f"9990.{9998 - minor}.9999" for minor in range(15, 10, -1)]
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"CommonPrefixes": [{"Prefix": f"{book}@{version}:"} for version in versions]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@", "Delimiter": ":", "MaxKeys": 10},
+    )
+    # the page is not in the newest versions...
+    for version in versions[:lambda_function.PAGE_PROBES]:
+        s3_stub.add_response(
+            "list_objects_v2", {},
+            {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@{version}:{page}@", "MaxKeys": 10},
+        )
+    # ...so all the book's pages are listed at once, newest version first
+    key = f"{book}@{versions[-1]}:{page}@9979.9999.9999.html"
+    s3_stub.add_response(
+        "list_objects_v2",
+        {"Contents": [
+            {"Key": f"{book}@{versions[-2]}:00000000-0000-0000-0000-000000000000@9998.9999.9999.html"},
+            {"Key": f"{key}.gz"},
+            {"Key": key},
+        ]},
+        {"Bucket": lambda_function.CONTENTS_BUCKET_NAME, "Prefix": f"{book}@"},
+    )
+    ret = lambda_function.lambda_handler(set_uri(apigw_event, f"/{book}:{page}.html"), "")
+
+    assert ret["headers"]["location"][0]["value"] == f"/{book}@8.11:{page}@19.html"
+
+
+def test_lambda_handler_metrics(apigw_event, s3_stub, capsys):
+    set_uri(apigw_event, "/raw/02776133-d49d-49cb-bfaa-67c7f61b25a1.json")
+    s3_stub.add_client_error("get_object", "NoSuchKey", http_status_code=404)
+    s3_stub.add_response("list_objects_v2", {"Contents": [
+        {"Key": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.13.json"},
+        {"Key": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14.json"},
+        {"Key": "raw/02776133-d49d-49cb-bfaa-67c7f61b25a1@8.14.html"},
+    ]})
+    lambda_function.lambda_handler(apigw_event, "")
+    lambda_function.lambda_handler(set_uri(apigw_event, "/raw/02776133-d49d-49cb-bfaa-67c7f61b25a1.json"), "")
+
+    miss, hit = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert miss["Shape"] == "raw"
+    assert miss["Status"] == "301"
+    assert miss["Resolution"] == "listing"
+    assert miss["S3Calls"] == 2
+    assert miss["ListPages"] == 1
+    assert miss["KeysScanned"] == 3
+    assert miss["CacheHits"] == 0
+    assert hit["Resolution"] == "cache"
+    assert hit["S3Calls"] == 0
+    assert hit["CacheHits"] == 1
@@ -0,0 +1,111 @@
+import uuid
+
+import pytest
+
+from key_index import KeyIndex, build, open_index
+
+BOOK = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+PAGE = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+NEW_PAGE = "6b34a220-6ad1-55c4-9873-93d02625c88a"
+UNKNOWN = "00000000-0000-0000-0000-000000000000"
+
+KEYS = [
+    f"raw/{BOOK}@1.9.json",
+    f"raw/{BOOK}@1.10.json",
+    f"raw/{PAGE}@20.json",
+    f"raw/{PAGE}@21.json",
+    f"raw/{PAGE}@21.html",
+    f"baked/{BOOK}@1.9.html",
+    f"baked/{BOOK}@1.10.html",
+    f"baked/{BOOK}@1.10.json",
+    f"baked/{BOOK}@1.9:{PAGE}@20.html",
+    f"baked/{BOOK}@1.10:{PAGE}@21.html",
+    f"baked/{BOOK}@1.10:{NEW_PAGE}@1.html",
+    f"baked/{BOOK}@1.9:{NEW_PAGE}@1.json",
+    # not indexed
+    f"baked/{BOOK}@1.11.html.gz",
+    f"baked/latest/{BOOK}.html",
+    "resources/4a3b1c",
+]
+
+
+@pytest.fixture()
+def index():
+    return KeyIndex(build(KEYS))
+
+
+@pytest.mark.parametrize("path, suffix, expected", [
+    (f"raw/{BOOK}", ".json", f"raw/{BOOK}@1.10.json"),
+    (f"raw/{PAGE}", ".json", f"raw/{PAGE}@21.json"),
+    (f"raw/{PAGE}", ".html", f"raw/{PAGE}@21.html"),
+    (f"baked/{BOOK}", ".html", f"baked/{BOOK}@1.10.html"),
+    (f"baked/{BOOK}:{PAGE}", ".html", f"baked/{BOOK}@1.10:{PAGE}@21.html"),
+    (f"baked/{BOOK}@1.9:{PAGE}", ".html", f"baked/{BOOK}@1.9:{PAGE}@20.html"),
+    (f"baked/{BOOK}:{NEW_PAGE}", ".json", f"baked/{BOOK}@1.9:{NEW_PAGE}@1.json"),
+    (f"baked/{BOOK.upper()}", ".html", f"baked/{BOOK}@1.10.html"),
+])
+def test_resolve(index, path, suffix, expected):
+    assert index.resolve(path, suffix) == (True, expected)
+
+
+@pytest.mark.parametrize("path, suffix", [
+    (f"raw/{UNKNOWN}", ".json"),
+    (f"baked/{PAGE}", ".html"),
+    (f"baked/{UNKNOWN}:{PAGE}", ".html"),
+])
+def test_resolve_unknown(index, path, suffix):
+    assert index.resolve(path, suffix) == (False, None)
+
+
+@pytest.mark.parametrize("path, suffix", [
+    # to be listed, the index can't tell
+    (f"raw/{BOOK}", ".html"),
+    (f"baked/{BOOK}@1.8:{PAGE}", ".html"),
+    (f"baked/{BOOK}:{UNKNOWN}", ".html"),
+    ("raw/not-a-uuid", ".json"),
+])
+def test_resolve_undecided(index, path, suffix):
+    assert index.resolve(path, suffix) == (True, None)
+
+
+def test_resolve_versions_of_different_lengths():
+    keys = [f"raw/{BOOK}@1.9.json", f"raw/{BOOK}@1.10.1.json", f"raw/{BOOK}@1.10.json", f"raw/{BOOK}@2.json"]
+    index = KeyIndex(build(keys[:-1]))
+
+    assert index.resolve(f"raw/{BOOK}", ".json") == (True, f"raw/{BOOK}@1.10.1.json")
+    assert KeyIndex(build(keys)).resolve(f"raw/{BOOK}", ".json") == (True, f"raw/{BOOK}@2.json")
+
+
+def test_len(index):
+    assert len(index) == 10
+
+
+def test_bloom_filter():
+    ids = [f"{i:08x}-0000-0000-0000-000000000000" for i in range(1000)]
+    index = KeyIndex(build(f"raw/{id}@1.json" for id in ids))
+
+    assert all(index.might_contain("raw", uuid.UUID(id).bytes) for id in ids)
+    false_positives = sum(index.might_contain("raw", uuid.uuid4().bytes) for i in range(1000))
+    assert false_positives < 50
+
+
+def test_open_index(tmpdir):
+    path = tmpdir.join("key-index.bin")
+    assert open_index(str(path)) is None
+    path.write_binary(build(KEYS))
+
+    index = open_index(str(path))
+    assert index.resolve(f"raw/{BOOK}", ".json") == (True, f"raw/{BOOK}@1.10.json")
+
+
+def test_age():
+    index = KeyIndex(build(KEYS, built_at=1000.5))
+
+    assert index.built_at == 1000.5
+    assert index.age(now=4600.5) == 3600
+    assert KeyIndex(build(KEYS)).age() < 60
+
+
+def test_not_an_index():
+    with pytest.raises(ValueError):
+        KeyIndex(b"\0" * 64)
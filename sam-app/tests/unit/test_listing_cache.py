@@ -0,0 +1,70 @@
+import pytest
+
+from listing_cache import MISSING, ListingCache
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+def test_hit_and_miss(clock):
+    cache = ListingCache(maxsize=2, ttl=10, clock=clock)
+
+    assert cache.get("raw/abc") is MISSING
+    cache.set("raw/abc", "raw/abc@1.1.json")
+    assert cache.get("raw/abc") == "raw/abc@1.1.json"
+    assert cache.stats() == {"size": 1, "hits": 1, "negative_hits": 0,
+                             "misses": 1, "expirations": 0, "evictions": 0}
+
+
+def test_expiration(clock):
+    cache = ListingCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("raw/abc", "raw/abc@1.1.json")
+
+    clock.now = 9
+    assert cache.get("raw/abc") == "raw/abc@1.1.json"
+    clock.now = 10
+    assert cache.get("raw/abc") is MISSING
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_negative_entries(clock):
+    cache = ListingCache(maxsize=2, ttl=10, negative_ttl=2, clock=clock)
+    cache.set("raw/missing", None)
+
+    assert cache.get("raw/missing") is None
+    assert cache.negative_hits == 1
+    clock.now = 2
+    assert cache.get("raw/missing") is MISSING
+
+
+def test_lru_eviction(clock):
+    cache = ListingCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", "a@1")
+    cache.set("b", "b@1")
+    # touching "a" makes "b" the least recently used
+    cache.get("a")
+    cache.set("c", "c@1")
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == "a@1"
+    assert cache.get("c") == "c@1"
+    assert cache.evictions == 1
+
+
+def test_disabled(clock):
+    cache = ListingCache(maxsize=2, ttl=0, clock=clock)
+    cache.set("a", "a@1")
+
+    assert cache.get("a") is MISSING
@@ -0,0 +1,59 @@
+import io
+import json
+
+from metrics import InvocationMetrics
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_record():
+    clock = FakeClock()
+    metrics = InvocationMetrics("Test", clock=clock)
+    metrics.set("Shape", "baked")
+    metrics.add("S3Calls")
+    metrics.add("KeysScanned", 10)
+    with metrics.timed("S3Time"):
+        clock.now += 0.25
+    with metrics.timed("S3Time"):
+        clock.now += 0.5
+    clock.now += 1
+
+    record = metrics.record()
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Test"
+    assert {"Name": "S3Time", "Unit": "Milliseconds"} in directive["Metrics"]
+    # every dimension must be in the record
+    assert all(name in record for dimensions in directive["Dimensions"] for name in dimensions)
+    assert record["Shape"] == "baked"
+    assert record["S3Calls"] == 1
+    assert record["KeysScanned"] == 10
+    assert record["S3Time"] == 750
+    assert record["Duration"] == 1750
+
+
+def test_start_over():
+    metrics = InvocationMetrics("Test")
+    metrics.add("S3Calls")
+    metrics.set("Uri", "/raw/abc.json")
+    metrics.start()
+
+    record = metrics.record()
+    assert record["S3Calls"] == 0
+    assert "Uri" not in record
+
+
+def test_emit():
+    stream = io.StringIO()
+    InvocationMetrics("Test").emit(stream)
+    assert json.loads(stream.getvalue())["_aws"]["CloudWatchMetrics"][0]["Namespace"] == "Test"
+
+    stream = io.StringIO()
+    InvocationMetrics("").emit(stream)
+    assert stream.getvalue() == ""
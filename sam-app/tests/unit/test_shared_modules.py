@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+HERE = os.path.dirname(__file__)
+SRC = os.path.join(HERE, "..", "..", "src")
+REQUEST_HANDLER = os.path.join(HERE, "..", "..", "..", "request-handler")
+SHARED_NOTE = "both copies must be kept identical"
+
+
+def shared_modules():
+    """The modules of ``src/`` that note they are shared with ``request-handler``"""
+    for name in sorted(os.listdir(SRC)):
+        if name.endswith(".py"):
+            with open(os.path.join(SRC, name)) as f:
+                if SHARED_NOTE in f.read():
+                    yield name
+
+
+def test_shared_modules_found():
+    assert set(shared_modules()) >= {"listing_cache.py", "version_index.py"}
+
+
+@pytest.mark.parametrize("name", list(shared_modules()))
+def test_request_handler_copy_is_identical(name):
+    with open(os.path.join(SRC, name)) as f:
+        src = f.read()
+    with open(os.path.join(REQUEST_HANDLER, name)) as f:
+        copy = f.read()
+    assert src == copy, f"request-handler/{name} differs from sam-app/src/{name}"
@@ -0,0 +1,111 @@
+import pytest
+
+from version_index import (VersionIndex, invert_key, invert_version, parse_key, parse_version,
+                           uninvert_key, uninvert_version)
+
+BOOK = "02776133-d49d-49cb-bfaa-67c7f61b25a1"
+PAGE = "301d5176-9ace-4219-b44b-85dcf781e1e3"
+
+
+@pytest.mark.parametrize("key, expected", [
+    # raw-book-json / raw-page-html
+    (f"{BOOK}@8.13.json", (BOOK, (8, 13), None, None)),
+    (f"raw/{PAGE}@21.html", (PAGE, (21,), None, None)),
+    # baked-book-html
+    (f"baked/{BOOK}@1.10.html", (BOOK, (1, 10), None, None)),
+    # baked-page-json, with and without the page version
+    (f"baked/{BOOK}@8.13:{PAGE}@21.json", (BOOK, (8, 13), PAGE, (21,))),
+    (f"{BOOK}@8.13:{PAGE}.json", (BOOK, (8, 13), PAGE, None)),
+    # a common prefix of a book version's pages
+    (f"baked/{BOOK}@8.13.2:", (BOOK, (8, 13, 2), None, None)),
+    # short test idents used by the dumper's sanity tests
+    ("abc123@1.1:def456@9.html", ("abc123", (1, 1), "def456", (9,))),
+    # the dumper's latest version pointers have no version
+    (f"baked/latest/{BOOK}:{PAGE}.json", None),
+    ("resources/deadbeef", None),
+])
+def test_parse_key(key, expected):
+    assert parse_key(key) == expected
+
+
+def test_parse_version_ordering():
+    assert parse_version("1.10") > parse_version("1.9")
+    assert parse_version("2") < parse_version("2.1") < parse_version("2.1.1")
+
+
+@pytest.fixture()
+def index():
+    return VersionIndex([
+        f"baked/{BOOK}@1.9.json",
+        f"baked/{BOOK}@1.9:{PAGE}@20.json",
+        f"baked/{BOOK}@1.10.json",
+        f"baked/{BOOK}@1.2.json",
+        f"baked/{BOOK}@1.2:{PAGE}@19.json",
+        f"baked/latest/{BOOK}.json",
+    ])
+
+
+def test_latest(index):
+    assert index.latest() == f"baked/{BOOK}@1.10.json"
+
+
+def test_latest_containing_page(index):
+    assert index.latest(PAGE) == f"baked/{BOOK}@1.9:{PAGE}@20.json"
+    assert index.latest(f"{PAGE}@19") == f"baked/{BOOK}@1.2:{PAGE}@19.json"
+    assert index.latest(f"{PAGE}@1") is None
+    assert index.latest("00000000-0000-0000-0000-000000000000") is None
+
+
+def test_newest(index):
+    assert list(index.newest()) == [
+        f"baked/{BOOK}@1.10.json",
+        f"baked/{BOOK}@1.9.json",
+        f"baked/{BOOK}@1.2.json",
+    ]
+
+
+def test_exists(index):
+    assert index.exists("1.10")
+    assert index.exists((1, 2))
+    assert not index.exists("1.1")
+    assert not index.exists("1.11")
+
+
+def test_empty():
+    index = VersionIndex()
+    assert index.latest() is None
+    assert not index.exists("1.1")
+    assert len(index) == 0
+
+
+@pytest.mark.parametrize("version, inverted", [
+    ("1.10", "9997.9988.9999"),
+    ("21", "9977.9999.9999"),
+    ("1.10.0", "9997.9988.9998"),
+    ("0", "9998.9999.9999"),
+])
+def test_invert_version(version, inverted):
+    assert invert_version(version) == inverted
+    assert uninvert_version(inverted) == version
+
+
+def test_inverted_version_ordering():
+    versions = ["1.9", "2", "1.10", "1.10.1", "0.1", "1.10.0"]
+    assert sorted(versions, key=invert_version) == ["2", "1.10.1", "1.10.0", "1.10", "1.9", "0.1"]
+
+
+@pytest.mark.parametrize("version", ["1.2.3.4", "9999", "1.10000"])
+def test_invert_version_out_of_range(version):
+    with pytest.raises(ValueError):
+        invert_version(version)
+
+
+@pytest.mark.parametrize("key, inverted", [
+    (f"baked/{BOOK}@1.10:{PAGE}@21.html.gz", f"baked/{BOOK}@9997.9988.9999:{PAGE}@9977.9999.9999.html.gz"),
+    (f"/raw/{PAGE}@21.json", f"/raw/{PAGE}@9977.9999.9999.json"),
+    (f"baked/{BOOK}@1.10:{PAGE}", f"baked/{BOOK}@9997.9988.9999:{PAGE}"),
+    (f"baked/latest/{BOOK}.json", f"baked/latest/{BOOK}.json"),
+])
+def test_invert_key(key, inverted):
+    assert invert_key(key) == inverted
+    assert uninvert_key(inverted) == key